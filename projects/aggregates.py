@@ -0,0 +1,21 @@
+#the aggregates from metrics.py behind the shared on-disk cache (diskcache.py).
+#import these instead of the metrics versions in the app or in projects/Project.ipynb:
+#   import sys; sys.path.append("projects")   #from the repo root
+#   from dataset import read_data
+#   from aggregates import sales_by
+#   sales_by(read_data(), "Category")
+#whichever of the two computes an aggregate first, the other then loads it from disk.
+#each one names the frame columns it reads, only those are hashed for its cache key
+import metrics
+import sharded
+from diskcache import disk_cached
+
+DEPENDS = [metrics, sharded] #group_agg, filter_mask etc. and the sharded executor behind them
+
+sales_by = disk_cached(metrics.sales_by, DEPENDS, lambda col: [col, "Sales"])
+top_customers = disk_cached(metrics.top_customers, DEPENDS, ["Customer ID", "Customer Name", "Order ID", "Sales"])
+state_summary = disk_cached(metrics.state_summary, DEPENDS, ["State", "Order ID", "Customer ID", "Sales"])
+segment_stats = disk_cached(metrics.segment_stats, DEPENDS, ["Segment", "Order ID", "Customer ID", "Sales"])
+order_level = disk_cached(metrics.order_level, DEPENDS, ["Order ID", "Order Date", "Delay_Days"])
+late_over_time = disk_cached(metrics.late_over_time, DEPENDS, ["Order ID", "OrderDate", "Is_Late"])
+sales_over_time = disk_cached(metrics.sales_over_time, DEPENDS, ["Order Date", "Category", "Sales"])
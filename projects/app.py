@@ -1,17 +1,56 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-from loader import load_data
+from loader import load_kpi_snapshot, dataset_watcher, dataset_stats, select_dataset, refresh_on_change
+import warmup
 
-df = load_data()
+warmup.start() #parse the dataset and import the plotting libraries in the background
+select_dataset() #which dataset this session works on, see registry.py
+refresh_on_change() #rerun when the data files change
 
 if st.button("Refresh App"):
+    dataset_watcher().refresh() #the watcher looks for changed data now instead of at its next poll
     st.rerun()
+if dataset_watcher().error:
+    st.warning(f"The dataset file couldn't be read, still retrying: {dataset_watcher().error}")
 st.markdown("**About this Project**")
 st.markdown("This interactive dashboard was developed as part of the INSY 6500" \
 " Exploratory Data Analysis project at Auburn University. " \
 "The goal is to explore customer purchasing behavior and sales performance using real transactional data.")
 
+#headline numbers straight from the offline snapshot, nothing is computed here
+snap = load_kpi_snapshot()
+if snap is not None:
+    kpis = snap["kpis"]
+    col1, col2, col3, col4, col5 = st.columns(5)
+    col1.metric("Total Sales", f"${kpis['total_sales']:,.2f}")
+    col2.metric("Total Orders", f"{kpis['total_orders']:,}")
+    col3.metric("Average Order Value", f"${kpis['avg_order_value']:,.2f}")
+    col4.metric("% Orders Late", f"{kpis['shipping_pct_late']:.1f}%")
+    col5.metric("95th Percentile Delay (days)", f"{kpis['shipping_p95_delay']:.2f}")
+    st.caption(f"Snapshot of dataset version {snap['dataset_version']} built {snap['built_at']}")
+elif dataset_watcher().aggregates is not None:
+    #no snapshot for this data (e.g. rows were appended since it was built), use the
+    #watcher's running totals which are kept up to date incrementally
+    kpis = dataset_watcher().aggregates.kpis()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Total Sales", f"${kpis['total_sales']:,.2f}")
+    col2.metric("Total Orders", f"{kpis['total_orders']:,}")
+    col3.metric("Average Order Value", f"${kpis['avg_order_value']:,.2f}")
+    st.caption(f"Live totals, data version {dataset_watcher().version}")
+
+#what the server is holding in memory for each dataset, see registry.py
+with st.expander("Loaded datasets"):
+    stats, used, budget = dataset_stats()
+    st.caption(f"{used / 2 ** 20:,.1f} MB of the {budget / 2 ** 20:,.0f} MB memory budget in use")
+    st.dataframe(
+        stats,
+        hide_index=True,
+        column_config={
+            "Memory (MB)": st.column_config.NumberColumn(format="%.1f"),
+            "Last load (s)": st.column_config.NumberColumn(format="%.2f"),
+            "Derived builds (s)": st.column_config.NumberColumn(format="%.2f"),
+        },
+    )
+
 #Dashboards that could add value
 #Overall sales dashboard with date and segment breakdown
 #Customer spend dashboard that shows who is purchasing the most, and how many orders they are placing
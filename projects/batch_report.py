@@ -0,0 +1,207 @@
+#headless report renderer, run from the repo root:
+#   python projects/batch_report.py --out reports --workers 4 --png
+#sweeps filter combinations (every Region x Segment by default) and writes one static
+#HTML report (and optionally a PNG) per combination using the same compute functions
+#as the pages in metrics.py. no streamlit server is involved.
+import argparse
+import html
+import itertools
+import json
+import multiprocessing as mp
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from dataset import DATA_PATH, read_data
+from metrics import (
+    DEFAULT_LATE_THRESHOLD, delay_days, filter_mask, late_over_time, order_level,
+    sales_by, sales_kpis, sales_over_time, shipping_kpis, state_summary,
+)
+
+ALL = "All"
+
+#the dataset the workers render from. it is loaded once in the parent: with fork the
+#workers inherit it copy-on-write, otherwise it is sent once per worker by _init_worker
+_DATA = None
+
+
+def _init_worker(df):
+    global _DATA
+    _DATA = df
+
+
+def default_combos(df):
+    #every Region x Segment pair, plus "All" on each axis
+    regions = [ALL] + sorted(df["Region"].dropna().unique())
+    segments = [ALL] + sorted(df["Segment"].dropna().unique())
+    return [{"region": r, "segment": s} for r, s in itertools.product(regions, segments)]
+
+
+def combo_name(combo):
+    #file system friendly name, e.g. region-West_segment-Consumer
+    parts = [f"{k}-{v}" for k, v in sorted(combo.items())]
+    return re.sub(r"[^A-Za-z0-9_.-]+", "", "_".join(parts).replace(" ", "")) or "all"
+
+
+def combo_mask(df, combo):
+    #turn a combo dict into the same filter the pages build
+    def pick(key):
+        value = combo.get(key, ALL)
+        if value == ALL:
+            return None
+        return value if isinstance(value, list) else [value]
+
+    return filter_mask(
+        df,
+        segments=pick("segment"),
+        regions=pick("region"),
+        ship_modes=pick("ship_mode"),
+        categories=pick("category"),
+        start=combo.get("start"),
+        end=combo.get("end"),
+    )
+
+
+def _kpi_table(kpis, ship):
+    rows = [
+        ("Total Sales", f"${kpis['total_sales']:,.2f}"),
+        ("Total Orders", f"{kpis['total_orders']:,}"),
+        ("Average Order Value", f"${kpis['avg_order_value']:,.2f}"),
+        ("Average Delay (days)", f"{ship['avg_delay']:.2f}"),
+        ("95th Percentile Delay (days)", f"{ship['p95_delay']:.2f}"),
+        ("% Orders Late", f"{ship['pct_late']:.1f}%"),
+    ]
+    cells = "".join(f"<tr><th>{k}</th><td>{v}</td></tr>" for k, v in rows)
+    return f"<table>{cells}</table>"
+
+
+def _render_png(path, by_category, by_region, title):
+    import matplotlib
+    matplotlib.use("Agg") #no display in worker processes
+    import matplotlib.pyplot as plt
+
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(12, 4))
+    for ax, series, label in [(ax1, by_category, "Category"), (ax2, by_region, "Region")]:
+        series.plot(kind="bar", ax=ax)
+        ax.set_xlabel(label)
+        ax.set_ylabel("Sales ($)")
+        ax.ticklabel_format(style="plain", axis="y")
+        ax.tick_params(axis="x", rotation=0)
+    fig.suptitle(title)
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+
+
+def render_report(combo, out_dir, png=False, threshold_days=DEFAULT_LATE_THRESHOLD):
+    #compute everything for one combo and write <out_dir>/<name>.html (+ .png)
+    import plotly.express as px
+
+    df = _DATA
+    name = combo_name(combo)
+    title = ", ".join(f"{k.title()}: {v}" for k, v in sorted(combo.items()))
+
+    filtered = df[combo_mask(df, combo)]
+    if filtered.empty:
+        return name, None
+
+    kpis = sales_kpis(filtered)
+    orders = order_level(filtered, threshold_days)
+    ship = shipping_kpis(orders)
+    by_category = sales_by(filtered, "Category")
+    by_region = sales_by(filtered, "Region")
+
+    states = state_summary(filtered)
+    fig_map = px.choropleth(
+        states,
+        locations="state_abbrev",
+        locationmode="USA-states",
+        color="Total_Sales",
+        color_continuous_scale="Reds",
+        hover_name="State",
+        scope="usa",
+        title="Total Sales by State",
+    )
+    fig_late = px.line(
+        late_over_time(orders), x="OrderMonth", y="pct_late", markers=True,
+        labels={"OrderMonth": "Order Month", "pct_late": "% Orders Late"},
+        title="% of Late Orders Over Time",
+    )
+    fig_sales = px.line(
+        sales_over_time(filtered, "M"), x="Period", y="Sales", markers=True,
+        labels={"Period": "Date", "Sales": "Sales ($)"},
+        title="Monthly Sales",
+    )
+
+    figures = [fig_map, fig_late, fig_sales]
+    charts = "".join(
+        fig.to_html(full_html=False, include_plotlyjs="cdn" if i == 0 else False)
+        for i, fig in enumerate(figures)
+    )
+    tables = (
+        by_category.to_frame().to_html(float_format=lambda x: f"${x:,.2f}")
+        + by_region.to_frame().to_html(float_format=lambda x: f"${x:,.2f}")
+    )
+
+    html_path = os.path.join(out_dir, f"{name}.html")
+    heading = html.escape(title) #title carries --combos values
+    with open(html_path, "w", encoding="utf-8") as fh:
+        fh.write(
+            f"<html><head><meta charset='utf-8'><title>{heading}</title></head><body>"
+            f"<h1>{heading}</h1>{_kpi_table(kpis, ship)}{tables}{charts}</body></html>"
+        )
+
+    if png:
+        _render_png(os.path.join(out_dir, f"{name}.png"), by_category, by_region, title)
+
+    return name, html_path
+
+
+def run(combos=None, out_dir="reports", workers=None, png=False, path=DATA_PATH,
+        threshold_days=DEFAULT_LATE_THRESHOLD):
+    #load once, then fan the combos out over a process pool
+    df = read_data(path)
+    df["Delay_Days"] = delay_days(df)
+    combos = combos or default_combos(df)
+    os.makedirs(out_dir, exist_ok=True)
+
+    _init_worker(df)
+    if "fork" in mp.get_all_start_methods():
+        pool = ProcessPoolExecutor(workers, mp_context=mp.get_context("fork"))
+    else:
+        pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(df,))
+
+    with pool:
+        futures = [pool.submit(render_report, c, out_dir, png, threshold_days) for c in combos]
+        return [f.result() for f in futures]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render static dashboard reports for filter combinations.")
+    parser.add_argument("--data", default=DATA_PATH, help="path to train.csv")
+    parser.add_argument("--out", default="reports", help="output directory")
+    parser.add_argument("--combos", help="JSON file with a list of filter dicts "
+                        "(keys: region, segment, ship_mode, category, start, end)")
+    parser.add_argument("--workers", type=int, default=None, help="process pool size (default: CPU count)")
+    parser.add_argument("--threshold", type=int, default=DEFAULT_LATE_THRESHOLD, help="late order threshold in days")
+    parser.add_argument("--png", action="store_true", help="also write a PNG summary per report")
+    args = parser.parse_args(argv)
+
+    combos = None
+    if args.combos:
+        with open(args.combos, encoding="utf-8") as fh:
+            combos = json.load(fh)
+
+    started = time.perf_counter()
+    results = run(combos, args.out, args.workers, args.png, args.data, args.threshold)
+    written = [name for name, path in results if path]
+    empty = [name for name, path in results if not path]
+
+    print(f"wrote {len(written)} reports to {args.out} in {time.perf_counter() - started:.1f}s")
+    if empty:
+        print(f"skipped {len(empty)} empty combinations: {', '.join(empty)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#customer analytics table: recency / frequency / monetary value per customer, the month of
+#their first order, and the months each customer ordered in for the cohort retention
+#matrix. fed the same rows as the watcher's running totals (see
+#watcher.IncrementalAggregates), so it is built in one pass when a data version is read and
+#appended rows are folded in on their own. every per customer number is a numpy array
+#indexed by a customer row, a batch of rows is a few bincounts / ufunc.at calls over those
+#rows, and the RFM scores and cohort matrix are worked out from the arrays when asked for.
+#nothing in here touches streamlit.
+import threading
+
+import numpy as np
+import pandas as pd
+
+from dataset import MISSING_DAY
+
+SCORES = 5 #RFM scores run 1..SCORES, SCORES best (quintiles)
+MONTH_SLOTS = 2 ** 20 #months per customer row in the active month keys, far beyond any data
+
+
+def _months(days):
+    #int day numbers -> months since 1970-01
+    return days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+
+def _score(values):
+    #1..SCORES by quantile of values, higher values score higher, ties share a score
+    if not len(values):
+        return np.zeros(0, dtype=np.int64)
+    pct = pd.Series(values).rank(pct=True, method="max").to_numpy()
+    return np.ceil(pct * SCORES).astype(np.int64)
+
+
+class CustomerAnalytics:
+    COLUMNS = ["Customer ID", "Customer Name", "Segment", "Order ID", "Order Day", "Sales"]
+
+    def __init__(self):
+        self.keys = {} #customer id -> row in the arrays below
+        self.names = np.zeros(0, dtype=object)
+        self.segments = np.zeros(0, dtype=object)
+        self.first_day = np.zeros(0, dtype=np.int64) #day numbers, see dataset.py
+        self.last_day = np.zeros(0, dtype=np.int64)
+        self.orders = np.zeros(0, dtype=np.int64)
+        self.lines = np.zeros(0, dtype=np.int64)
+        self.sales = np.zeros(0, dtype=np.float64)
+        self.active = np.zeros(0, dtype=np.int64) #sorted row * MONTH_SLOTS + month ordered in
+        self._seen = set() #order ids already counted, lines of an order can arrive in two appends
+        self._lock = threading.Lock()
+
+    def update(self, rows):
+        #fold new order lines in (needs the COLUMNS)
+        rows = rows[rows["Order Day"].to_numpy() != MISSING_DAY]
+        if rows.empty:
+            return self
+
+        order_ids = rows["Order ID"].astype(str)
+        new_order = (~order_ids.duplicated() & ~order_ids.isin(self._seen)).to_numpy()
+        day = rows["Order Day"].to_numpy().astype(np.int64)
+
+        with self._lock:
+            self._seen.update(order_ids[new_order])
+            cust = self._rows(rows)
+            n = len(self.keys)
+            self.sales += np.bincount(cust, weights=rows["Sales"].to_numpy(dtype=np.float64), minlength=n)
+            self.lines += np.bincount(cust, minlength=n)
+            self.orders += np.bincount(cust[new_order], minlength=n)
+            np.minimum.at(self.first_day, cust, day)
+            np.maximum.at(self.last_day, cust, day)
+            #sort only the new keys and insert the unseen ones, active isn't sorted again
+            keys = np.unique(cust * MONTH_SLOTS + _months(day))
+            at = np.searchsorted(self.active, keys)
+            known = at < len(self.active)
+            known[known] = self.active[at[known]] == keys[known]
+            self.active = np.insert(self.active, at[~known], keys[~known])
+        return self
+
+    def _rows(self, rows):
+        #row per customer of every line, growing the arrays for customers not seen before
+        codes, uniques = pd.factorize(rows["Customer ID"].astype(str))
+        new = [i for i, u in enumerate(uniques) if u not in self.keys]
+        if new:
+            first = np.flatnonzero(~pd.Series(codes).duplicated().to_numpy())[new] #first line of each new customer
+            for i in new:
+                self.keys[uniques[i]] = len(self.keys)
+            k = len(new)
+            self.names = np.concatenate([self.names, rows["Customer Name"].to_numpy(dtype=object)[first]])
+            self.segments = np.concatenate([self.segments, rows["Segment"].to_numpy(dtype=object)[first]])
+            self.first_day = np.concatenate([self.first_day, np.full(k, np.iinfo(np.int64).max)])
+            self.last_day = np.concatenate([self.last_day, np.full(k, np.iinfo(np.int64).min)])
+            self.orders = np.concatenate([self.orders, np.zeros(k, dtype=np.int64)])
+            self.lines = np.concatenate([self.lines, np.zeros(k, dtype=np.int64)])
+            self.sales = np.concatenate([self.sales, np.zeros(k, dtype=np.float64)])
+        return np.array([self.keys[u] for u in uniques], dtype=np.int64)[codes]
+
+    def _shown(self, segments):
+        #customer rows in segments (every customer when None)
+        if segments is None:
+            return np.arange(len(self.keys))
+        return np.flatnonzero(pd.Series(self.segments).isin(list(segments)).to_numpy())
+
+    def as_of(self):
+        #date of the newest order seen (None before any)
+        with self._lock:
+            return pd.Timestamp(int(self.last_day.max()), unit="D") if len(self.last_day) else None
+
+    def rfm(self, segments=None):
+        #one row per customer in segments: first / last order, Recency (days before the newest
+        #order of the whole dataset), Frequency (orders), Monetary (sales), and R / F / M
+        #scores among the customers shown, highest Monetary first
+        with self._lock:
+            shown = self._shown(segments)
+            as_of = self.last_day.max() if len(self.last_day) else 0
+            recency = as_of - self.last_day[shown]
+            table = pd.DataFrame({
+                "Customer ID": np.array(list(self.keys), dtype=object)[shown],
+                "Customer Name": self.names[shown],
+                "Segment": self.segments[shown],
+                "First Order": self.first_day[shown].astype("datetime64[D]").astype("datetime64[ns]"),
+                "Last Order": self.last_day[shown].astype("datetime64[D]").astype("datetime64[ns]"),
+                "Recency": recency,
+                "Frequency": self.orders[shown],
+                "Monetary": self.sales[shown],
+            })
+        table["R"] = _score(-recency) #fewer days since the last order is better
+        table["F"] = _score(table["Frequency"].to_numpy())
+        table["M"] = _score(table["Monetary"].to_numpy())
+        table["RFM"] = table["R"].astype(str) + table["F"].astype(str) + table["M"].astype(str)
+        return table.sort_values("Monetary", ascending=False, ignore_index=True)
+
+    def cohorts(self, segments=None):
+        #customers who ordered, per first order month (rows) and months since it (columns 0..)
+        with self._lock:
+            rows, months = np.divmod(self.active, MONTH_SLOTS)
+            keep = np.isin(rows, self._shown(segments))
+            rows, months = rows[keep], months[keep]
+            cohort = _months(self.first_day[rows])
+        if not len(rows):
+            return pd.DataFrame(dtype=np.int64)
+
+        start = cohort.min()
+        offset = months - cohort
+        n_cohorts, n_offsets = int(cohort.max() - start) + 1, int(offset.max()) + 1
+        counts = np.bincount((cohort - start) * n_offsets + offset, minlength=n_cohorts * n_offsets)
+        matrix = pd.DataFrame(
+            counts.reshape(n_cohorts, n_offsets),
+            index=pd.PeriodIndex.from_ordinals(np.arange(start, start + n_cohorts), freq="M").to_timestamp(),
+            columns=pd.RangeIndex(n_offsets),
+        )
+        matrix.index.name = "Cohort"
+        matrix.columns.name = "Months Since First Order"
+        return matrix[matrix[0] > 0] #months nobody ordered in for the first time
+
+    def retention(self, segments=None):
+        #cohorts() as a share of each cohort's size
+        counts = self.cohorts(segments)
+        return counts.div(counts[0], axis=0) if not counts.empty else counts.astype(float)
@@ -0,0 +1,161 @@
+#plain data access shared by the streamlit app, the notebook and the command line tools.
+#nothing in here imports streamlit; loader.py adds the app's caching on top of it
+import csv
+import os
+
+import numpy as np
+import pandas as pd
+
+from partitions import CSV_DATE_FORMAT, PARTITION_FORMATS, list_partitions, prune
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+#a single train.csv, or a directory of year / month partitions (see partitions.py)
+#anchored at the repo root so the app and projects/Project.ipynb resolve the same file
+DATA_PATH = os.environ.get("DASHBOARD_DATA", os.path.join(REPO_ROOT, "Data", "train.csv"))
+
+#low cardinality text columns are stored as categories to keep the frame small
+CATEGORY_COLUMNS = {
+    "Order ID": "category",
+    "Ship Mode": "category",
+    "Customer ID": "category",
+    "Segment": "category",
+    "Country": "category",
+    "City": "category",
+    "State": "category",
+    "Postal Code": "category",
+    "Region": "category",
+    "Product ID": "category",
+    "Category": "category",
+    "Sub-Category": "category",
+    "Product Name": "category",
+}
+
+FRAME_FORMAT = 2 #bump when the columns / dtypes read_data returns change, see registry.py
+
+#every date column gets an int32 day number (days since 1970-01-01) next to it, so delays
+#and day buckets are integer arithmetic instead of datetime conversions
+DAY_COLUMNS = {"Order Date": "Order Day", "Ship Date": "Ship Day"}
+MISSING_DAY = np.iinfo(np.int32).min #day number of a missing date
+
+#date string -> day number, shared by every read in the process. a few thousand distinct
+#dates cover years of orders, so after the first read nearly every string is a lookup
+_parsed_days = {}
+
+
+def parse_days(values):
+    #date strings in CSV_DATE_FORMAT -> int32 day numbers. the strings are factorised first,
+    #so each distinct one is looked up once per call and parsed once per process
+    codes, uniques = pd.factorize(values)
+    new = [u for u in uniques if u not in _parsed_days]
+    if new:
+        parsed = pd.to_datetime(pd.Index(new), format=CSV_DATE_FORMAT).to_numpy()
+        _parsed_days.update(zip(new, parsed.astype("datetime64[D]").astype(np.int64).tolist()))
+    table = np.array([_parsed_days[u] for u in uniques] + [MISSING_DAY], dtype=np.int32)
+    return table[codes] #code -1 (missing) picks MISSING_DAY
+
+
+def day_numbers(dates):
+    #datetime column -> int32 day numbers, for files that store real dates (parquet)
+    days = dates.to_numpy().astype("datetime64[D]")
+    return np.where(np.isnat(days), MISSING_DAY, days.astype(np.int64)).astype(np.int32)
+
+
+def days_to_dates(days):
+    #int32 day numbers -> datetime64[ns], MISSING_DAY -> NaT
+    dates = days.astype("datetime64[D]").astype("datetime64[ns]")
+    dates[days == MISSING_DAY] = np.datetime64("NaT")
+    return dates
+
+
+def _add_dates(df):
+    #parse / number the date columns in place
+    for col, day_col in DAY_COLUMNS.items():
+        if col not in df.columns:
+            continue
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[day_col] = day_numbers(df[col])
+        else:
+            df[day_col] = parse_days(df[col])
+            df[col] = days_to_dates(df[day_col].to_numpy())
+    return df
+
+
+def _read_csv(source, **kwargs):
+    #dates are read as categories (one string per distinct date) and parsed by parse_days
+    return _add_dates(pd.read_csv(
+        source,
+        dtype={**CATEGORY_COLUMNS, **{c: "category" for c in DAY_COLUMNS}},
+        **kwargs,
+    ))
+
+
+def _source_columns(columns):
+    #columns to read from a file for columns: day numbers come from their date column
+    if columns is None:
+        return None
+    days = {day: col for col, day in DAY_COLUMNS.items()}
+    return list(dict.fromkeys(days.get(c, c) for c in columns))
+
+
+def _read_file(path, columns=None):
+    #columns may name day columns, their dates are read with them
+    columns = _source_columns(columns)
+    if PARTITION_FORMATS.get(os.path.splitext(path)[1].lower()) == "parquet":
+        return _add_dates(pd.read_parquet(path, columns=columns))
+    return _read_csv(path, usecols=columns)
+
+
+def read_data(path=DATA_PATH, start=None, end=None, columns=None):
+    #plain read with no streamlit caching, for scripts and worker processes.
+    #for a partition directory only the files overlapping [start, end] are read.
+    #columns: just these (and the date column of a day column asked for), all when None
+    if not os.path.isdir(path):
+        return _read_file(path, columns)
+
+    parts = prune(list_partitions(path), start, end)
+    if not parts: #nothing overlaps, keep the columns so the pages can still filter
+        return _read_file(list_partitions(path)[0][0], columns).head(0)
+    return read_partitions([p for p, _, _ in parts], columns)
+
+
+def read_partitions(paths, columns=None):
+    df = pd.concat([_read_file(p, columns) for p in paths], ignore_index=True)
+    #categories differ between files so concat falls back to object, convert back once
+    return df.astype({c: t for c, t in CATEGORY_COLUMNS.items() if c in df.columns})
+
+
+def read_columns(path=DATA_PATH):
+    #the columns read_data returns for path, without reading any rows
+    if os.path.isdir(path):
+        path = list_partitions(path)[0][0]
+    if PARTITION_FORMATS.get(os.path.splitext(path)[1].lower()) == "parquet":
+        import pyarrow.parquet as pq
+        names = [n for n in pq.read_schema(path).names if not n.startswith("__")] #no index columns
+    else:
+        with open(path, encoding="utf-8", newline="") as fh:
+            names = next(csv.reader(fh))
+    return names + [day for col, day in DAY_COLUMNS.items() if col in names]
+
+
+def read_date_bounds(path=DATA_PATH):
+    #(first, last) Order Date without loading the whole dataset
+    if not os.path.isdir(path):
+        dates = _read_file(path, columns=["Order Date"])["Order Date"]
+        return dates.min(), dates.max()
+
+    parts = list_partitions(path) #only the oldest and newest partition are opened
+    first = _read_file(parts[0][0], columns=["Order Date"])["Order Date"]
+    last = _read_file(parts[-1][0], columns=["Order Date"])["Order Date"]
+    return first.min(), last.max()
+
+
+def read_rows(path, appended=None, columns=None):
+    #full read of path (just columns when given), or just the raw csv rows in appended
+    #(bytes added to the end of path since the last read). used by the dataset watcher
+    if appended is None:
+        return read_data(path, columns=columns)
+
+    with open(path, encoding="utf-8", newline="") as fh:
+        names = next(csv.reader(fh)) #appended bytes have no header, reuse the file's
+    return _read_csv(appended, header=None, names=names)
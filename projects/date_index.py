@@ -0,0 +1,89 @@
+#prefix-sum index over order days: cumulative Sales, line and order counts per day for
+#every combination of a few dimensions (Segment x Region by default). the total for any
+#date range is then two lookups and a subtraction per combination, no row scan.
+#order counts stay exact because every order has a single Order Date, Segment and Region;
+#don't add a line-level dimension such as Category to dims if you need orders.
+import numpy as np
+import pandas as pd
+
+DEFAULT_DIMS = ("Segment", "Region")
+DATE_INDEX_COLUMNS = ["Order Date", "Order Day", "Order ID", "Sales", *DEFAULT_DIMS] #what a default DateIndex reads
+
+#how far back the comparison period starts for DateIndex.compare
+COMPARE_SHIFTS = {
+    "previous": None, #the same number of days right before the range
+    "quarter": pd.DateOffset(months=3),
+    "year": pd.DateOffset(years=1),
+}
+
+
+class DateIndex:
+    def __init__(self, df, dims=DEFAULT_DIMS):
+        self.dims = list(dims)
+        self.origin = df["Order Date"].min().normalize()
+        day = df["Order Day"].to_numpy() - (df["Order Day"].min() if len(df) else 0) #int32 day numbers, see dataset.py
+        self.n_days = int(day.max()) + 1 if len(day) else 0
+
+        #one integer code per dimension value, combined into a single combination id
+        cats = [pd.Categorical(df[d]) for d in self.dims]
+        self.values = {d: list(c.categories) for d, c in zip(self.dims, cats)}
+        shape = tuple(len(c.categories) for c in cats)
+        combo = np.ravel_multi_index([c.codes for c in cats], shape) if self.dims else np.zeros(len(df), dtype=int)
+        self.shape = shape
+        n_combos = int(np.prod(shape)) if shape else 1
+
+        #column 0 stays zero so range sums can always index day - 1
+        def cumulative(ids, days, weights):
+            counts = np.zeros((n_combos, self.n_days + 1))
+            np.add.at(counts, (ids, days + 1), weights)
+            return counts.cumsum(axis=1)
+
+        self.sales = cumulative(combo, day, df["Sales"].to_numpy())
+        self.lines = cumulative(combo, day, 1.0)
+
+        first_line = ~df["Order ID"].duplicated().to_numpy() #one line per order
+        self.orders = cumulative(combo[first_line], day[first_line], 1.0)
+
+    def _day(self, ts):
+        return (pd.Timestamp(ts).normalize() - self.origin).days
+
+    def _rows(self, filters):
+        #combination ids matching filters ({dim: [values]}, missing / None = all)
+        keep = np.ones(self.shape, dtype=bool)
+        for axis, dim in enumerate(self.dims):
+            selected = (filters or {}).get(dim)
+            if selected is None:
+                continue
+            wanted = np.isin(self.values[dim], list(selected))
+            keep &= wanted.reshape([-1 if a == axis else 1 for a in range(len(self.dims))])
+        return keep.ravel()
+
+    def totals(self, start, end, filters=None):
+        #{"sales", "lines", "orders"} for Order Date in [start, end] (inclusive days)
+        lo = int(np.clip(self._day(start), 0, self.n_days))
+        hi = int(np.clip(self._day(end) + 1, 0, self.n_days))
+        rows = self._rows(filters)
+
+        if hi <= lo:
+            return {"sales": 0.0, "lines": 0, "orders": 0}
+        return {
+            "sales": float(self.sales[rows, hi].sum() - self.sales[rows, lo].sum()),
+            "lines": int(round(self.lines[rows, hi].sum() - self.lines[rows, lo].sum())),
+            "orders": int(round(self.orders[rows, hi].sum() - self.orders[rows, lo].sum())),
+        }
+
+    def compare(self, start, end, filters=None, against="previous"):
+        #(current totals, comparison totals, (comparison start, comparison end))
+        start, end = pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize()
+        shift = COMPARE_SHIFTS[against]
+        if shift is None:
+            length = end - start + pd.Timedelta(days=1)
+            prev_start, prev_end = start - length, end - length
+        else:
+            prev_start, prev_end = start - shift, end - shift
+
+        return (
+            self.totals(start, end, filters),
+            self.totals(prev_start, prev_end, filters),
+            (prev_start, prev_end),
+        )
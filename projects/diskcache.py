@@ -0,0 +1,206 @@
+#content-addressed on-disk cache for aggregates, shared by the streamlit app, the notebook
+#and the command line tools. the key is a hash of CACHE_VERSION, the function's source, the
+#source of the modules it calls into, the *content* of the frame columns it reads and its
+#other arguments, so the same aggregate over the same rows is computed once no matter which
+#process asks for it first. files are evicted least recently used first once the cache
+#holds more than CACHE_MAX_MB. the directory is only scanned for that when this process's
+#running total of the cache size goes over the limit, or every EVICT_EVERY writes to pick
+#up what other processes wrote, not on every write.
+import functools
+import hashlib
+import inspect
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from dataset import REPO_ROOT
+
+CACHE_DIR = os.environ.get("DASHBOARD_CACHE", os.path.join(REPO_ROOT, ".cache", "aggregates"))
+CACHE_MAX_MB = float(os.environ.get("DASHBOARD_CACHE_MB", 256))
+CACHE_VERSION = 2 #bump when cached results change in a way the source hashes can't see (e.g. a library upgrade)
+MAX_CATEGORY_HASHES = 64 #categories whose hash is kept, see _categories_hash
+EVICT_EVERY = 64 #writes between scans of the cache directory when under the limit
+EVICT_TO = 0.9 #share of the limit a scan over it evicts down to, so the next writes don't scan again
+
+_category_lock = threading.Lock()
+_category_hashes = OrderedDict() #id(categories) -> (categories, their hash)
+_usage_lock = threading.Lock()
+_used_bytes = None #cache size at the last scan plus what this process wrote since, None before a scan
+_writes = 0 #since the last scan
+
+
+def _categories_hash(categories):
+    #filtered copies of a loaded column share its categories, so they are hashed once
+    with _category_lock:
+        hit = _category_hashes.get(id(categories))
+        if hit is not None and hit[0] is categories:
+            _category_hashes.move_to_end(id(categories))
+            return hit[1]
+    digest = hashlib.sha256(pd.util.hash_pandas_object(categories, index=False).to_numpy()).digest()
+    with _category_lock:
+        _category_hashes[id(categories)] = (categories, digest) #holding categories keeps its id from being reused
+        while len(_category_hashes) > MAX_CATEGORY_HASHES:
+            _category_hashes.popitem(last=False)
+    return digest
+
+
+def _update(digest, values):
+    #feed one column's values to digest: the raw buffer of numbers / dates, the codes and
+    #categories of a categorical, a per value hash of anything else
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        digest.update(_categories_hash(values.cat.categories))
+        digest.update(np.ascontiguousarray(values.cat.codes.to_numpy()))
+    elif isinstance(values.dtype, np.dtype) and values.dtype.kind in "biufcmM":
+        digest.update(values.dtype.str.encode("ascii"))
+        digest.update(np.ascontiguousarray(values.to_numpy()))
+    else:
+        digest.update(pd.util.hash_pandas_object(values, index=False).to_numpy())
+
+
+def frame_hash(df, columns=None):
+    #hash of a frame's (or series') values, index and column names. with columns, just the
+    #values and names of those columns (ones df doesn't have are skipped), for callers
+    #whose result doesn't depend on the index or the other columns
+    digest = hashlib.sha256()
+    if isinstance(df, pd.Series):
+        df = df.to_frame()
+    names = list(df.columns) if columns is None else [c for c in columns if c in df.columns]
+    digest.update(repr(names).encode("utf-8"))
+    for col in names:
+        _update(digest, df[col])
+    if columns is None:
+        _update(digest, df.index.to_series())
+    return digest.hexdigest()
+
+
+def _source_hash(obj):
+    #hash of a function's or a module's source
+    try:
+        source = inspect.getsource(obj).encode("utf-8")
+    except (OSError, TypeError):
+        source = obj.__code__.co_code if hasattr(obj, "__code__") else repr(obj).encode("utf-8")
+    return hashlib.sha256(source).hexdigest()
+
+
+@functools.lru_cache(maxsize=None)
+def _function_hash(fn, depends):
+    #changes whenever the function's code or the code of a module in depends does, so a
+    #change to a helper it calls (e.g. metrics.group_agg) doesn't serve old results
+    digest = hashlib.sha256(f"{CACHE_VERSION}:{fn.__module__}.{fn.__qualname__}".encode("utf-8"))
+    for obj in (fn, *depends):
+        digest.update(_source_hash(obj).encode("ascii"))
+    return digest.hexdigest()
+
+
+def cache_key(fn, df, args, kwargs, depends=(), columns=None):
+    digest = hashlib.sha256()
+    digest.update(_function_hash(fn, tuple(depends)).encode("ascii"))
+    digest.update(frame_hash(df, columns).encode("ascii"))
+    digest.update(pickle.dumps((args, sorted(kwargs.items())), protocol=4))
+    return digest.hexdigest()
+
+
+def disk_cached(fn, depends=(), columns=None):
+    #wraps fn(df, *args, **kwargs): results are pickled under CACHE_DIR by cache_key.
+    #depends: modules fn's result also depends on. columns: the df columns fn reads, a list
+    #or a function of (*args, **kwargs) returning one; only those are hashed (the whole
+    #frame and its index when None)
+    depends = tuple(depends)
+
+    @functools.wraps(fn)
+    def wrapper(df, *args, **kwargs):
+        cols = columns(*args, **kwargs) if callable(columns) else columns
+        key = cache_key(fn, df, args, kwargs, depends, cols)
+        path = os.path.join(CACHE_DIR, key[:2], f"{key}.pkl")
+
+        try:
+            with open(path, "rb") as fh:
+                result = pickle.load(fh)
+            os.utime(path) #mtime is the last use, see evict()
+            return result
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass #not cached yet (or a broken file, which gets overwritten below)
+
+        result = fn(df, *args, **kwargs)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as fh:
+                pickle.dump(result, fh, protocol=pickle.HIGHEST_PROTOCOL)
+                size = fh.tell()
+            os.replace(tmp_path, path) #atomic, so a reader in another process never sees half a file
+        except BaseException:
+            os.unlink(tmp_path) #e.g. a result that can't be pickled
+            raise
+        _wrote(size)
+        return result
+
+    wrapper.uncached = fn
+    return wrapper
+
+
+def _wrote(size):
+    #count a new file of size bytes, and evict when the cache may be over its limit
+    global _used_bytes, _writes
+    max_bytes = CACHE_MAX_MB * 2 ** 20
+    with _usage_lock:
+        _writes += 1
+        if _used_bytes is not None:
+            _used_bytes += size
+        if _used_bytes is not None and _used_bytes <= max_bytes and _writes < EVICT_EVERY:
+            return
+        _writes = 0
+        over = _used_bytes is not None and _used_bytes > max_bytes
+    used = _evict(CACHE_DIR, max_bytes * EVICT_TO if over else max_bytes)[1]
+    with _usage_lock:
+        _used_bytes = used
+
+
+def evict(cache_dir=CACHE_DIR, max_bytes=None):
+    #delete the least recently used results until the cache holds at most max_bytes
+    #(CACHE_MAX_MB by default), returns how many files were removed
+    return _evict(cache_dir, CACHE_MAX_MB * 2 ** 20 if max_bytes is None else max_bytes)[0]
+
+
+def _evict(cache_dir, max_bytes):
+    #(files removed, bytes left)
+    files = []
+    for root, _, names in os.walk(cache_dir):
+        for name in names:
+            if name.endswith(".pkl"):
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue #removed by another process
+                files.append((stat.st_mtime_ns, stat.st_size, path))
+
+    used = sum(size for _, size, _ in files)
+    removed = 0
+    for _, size, path in sorted(files):
+        if used <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            removed += 1
+        except OSError:
+            pass
+        used -= size
+    return removed, used
+
+
+def clear(cache_dir=CACHE_DIR):
+    #delete every cached result, returns how many files were removed
+    removed = 0
+    for root, _, files in os.walk(cache_dir):
+        for name in files:
+            if name.endswith(".pkl"):
+                os.remove(os.path.join(root, name))
+                removed += 1
+    return removed
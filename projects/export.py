@@ -0,0 +1,145 @@
+#export of the rows behind a page (or its aggregated table) to CSV / Parquet.
+#rows are pulled out of the frame a chunk at a time using the page's own mask and written
+#to one in memory buffer, so there is never a filtered copy of the frame or a CSV string
+#next to it. streamlit keeps every download in memory (a deferred one is read into its
+#media store when clicked), so the file itself isn't bounded: selections of more than
+#EXPORT_MAX_ROWS rows are refused instead
+import io
+import os
+
+import numpy as np
+import streamlit as st
+
+from dataset import DAY_COLUMNS
+
+EXPORT_CHUNK_ROWS = 50_000 #rows written per chunk
+EXPORT_MAX_ROWS = int(os.environ.get("DASHBOARD_EXPORT_MAX_ROWS", 1_000_000)) #bigger selections can't be downloaded
+
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+
+
+def iter_chunks(df, mask=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    #yield the masked rows of df in slices of chunk_rows without copying the full selection.
+    #the loader's internal day number columns are left out
+    if mask is None:
+        positions = np.arange(len(df))
+    else:
+        positions = np.flatnonzero(np.asarray(mask, dtype=bool))
+    columns = [i for i, c in enumerate(df.columns) if c not in DAY_COLUMNS.values()]
+
+    for start in range(0, len(positions), chunk_rows):
+        yield df.iloc[positions[start:start + chunk_rows], columns]
+
+
+def _empty(df):
+    #no rows, the exported columns
+    return df.head(0).drop(columns=list(DAY_COLUMNS.values()), errors="ignore")
+
+
+def write_csv(df, fh, mask=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    #header only goes out with the first chunk, every chunk after that is appended
+    wrote_header = False
+    for chunk in iter_chunks(df, mask, chunk_rows):
+        fh.write(chunk.to_csv(index=False, header=not wrote_header).encode("utf-8"))
+        wrote_header = True
+
+    if not wrote_header: #empty selection still gets a header row
+        fh.write(_empty(df).to_csv(index=False).encode("utf-8"))
+
+
+def write_parquet(df, fh, mask=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    #each chunk becomes its own row group so memory stays at one chunk
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    #categoricals are exported as plain values, otherwise every row group would
+    #carry its own dictionary and the schema could drift between chunks
+    def to_table(chunk):
+        chunk = chunk.astype({c: chunk[c].cat.categories.dtype for c in chunk.columns
+                              if chunk[c].dtype == "category"})
+        return pa.Table.from_pandas(chunk, preserve_index=False)
+
+    writer = None
+    try:
+        for chunk in iter_chunks(df, mask, chunk_rows):
+            table = to_table(chunk)
+            if writer is None:
+                writer = pq.ParquetWriter(fh, table.schema)
+            writer.write_table(table.cast(writer.schema))
+
+        if writer is None: #empty selection
+            pq.write_table(to_table(_empty(df)), fh)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def export_to_file(df, fmt, mask=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    #the file contents of the selection as bytes
+    writer = write_parquet if fmt == "Parquet" else write_csv
+    with io.BytesIO() as fh:
+        writer(df, fh, mask=mask, chunk_rows=chunk_rows)
+        return fh.getvalue()
+
+
+def _as_frame(table):
+    #group-by results come back as Series or with the keys in the index, flatten them to columns
+    if table.ndim == 1:
+        return table.reset_index()
+    if table.index.names != [None]:
+        return table.reset_index()
+    return table
+
+
+def export_button(df, mask=None, name="export", tables=None, key=None, container=None, full_rows=None):
+    #export picker + download button; the file is only generated when the button is clicked
+    #df/mask are the page's full frame and its filter mask, tables are any aggregated
+    #frames the page shows (label -> frame, or a function making it when it is picked) that
+    #can be exported instead of the rows.
+    #full_rows (see loader.full_rows) exports every dataset column of df's rows, not just
+    #the ones the page loaded; it is called with mask and only those rows are read
+    container = container or st.sidebar
+    key = key or name
+    tables = tables or {}
+
+    container.subheader("Export")
+    what = container.selectbox(
+        "Data",
+        options=["Filtered rows"] + list(tables.keys()),
+        key=f"{key}_what",
+    )
+    fmt = container.radio(
+        "Format",
+        options=list(EXPORT_FORMATS.keys()),
+        horizontal=True,
+        key=f"{key}_format",
+    )
+    extension, mime = EXPORT_FORMATS[fmt]
+
+    if what == "Filtered rows":
+        n_rows = len(df) if mask is None else int(np.count_nonzero(mask))
+        if full_rows is not None:
+            source, source_mask = (lambda: full_rows(mask)), None
+        else:
+            source, source_mask = (lambda: df), mask
+        file_stem = name
+    else: #aggregated tables are already small, export them whole
+        table = _as_frame(tables[what]() if callable(tables[what]) else tables[what])
+        n_rows, source, source_mask = len(table), (lambda: table), None
+        file_stem = f"{name}_{what.lower().replace(' ', '_')}"
+
+    too_big = n_rows > EXPORT_MAX_ROWS
+    container.download_button(
+        f"Download {fmt}",
+        data=b"" if too_big else lambda: export_to_file(source(), fmt, mask=source_mask), #callable so nothing is built until clicked
+        file_name=f"{file_stem}.{extension}",
+        mime=mime,
+        key=f"{key}_download",
+        on_click="ignore", #downloading shouldn't rerun the page
+        disabled=too_big,
+    )
+    if too_big:
+        container.caption(f"{n_rows:,} rows, exports are limited to {EXPORT_MAX_ROWS:,}. Narrow the filters to download.")
@@ -0,0 +1,70 @@
+#import-time report for the entry point and the pages, run from the repo root:
+#   python projects/import_times.py [--top 10]
+#for every script the top level imports are run in a fresh interpreter with -X importtime,
+#so each number is a cold start (what the first visitor after a deploy pays)
+import argparse
+import ast
+import glob
+import os
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def top_level_imports(path):
+    #the import block at the top of the script, as source lines. imports further down
+    #are the deferred ones and only run when that part of the page is drawn
+    with open(path, encoding="utf-8") as fh:
+        tree = ast.parse(fh.read(), filename=path)
+
+    imports = []
+    for node in tree.body:
+        if not isinstance(node, (ast.Import, ast.ImportFrom)):
+            break
+        imports.append(ast.unparse(node))
+    return imports
+
+
+def _importtime(code):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=PROJECT_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return result.stderr
+
+
+def measure(code, baseline=()):
+    #(total seconds, {module: cumulative seconds}) for running code in a fresh interpreter,
+    #leaving out the modules a bare interpreter imports anyway (baseline)
+    modules = {}
+    for line in _importtime(code).splitlines():
+        #import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  ") and name.strip() not in baseline: #nested ones are already in the cumulative
+            modules[name.strip()] = int(cumulative) / 1e6
+
+    return sum(modules.values()), modules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold import time of app.py and the pages.")
+    parser.add_argument("--top", type=int, default=5, help="slowest modules to list per script")
+    args = parser.parse_args(argv)
+
+    _, startup = measure("pass")
+    scripts = [os.path.join(PROJECT_DIR, "app.py")] + sorted(glob.glob(os.path.join(PROJECT_DIR, "pages", "*.py")))
+    for path in scripts:
+        total, modules = measure("\n".join(top_level_imports(path)), baseline=set(startup))
+        print(f"{os.path.relpath(path, PROJECT_DIR):40s} {total:6.3f}s")
+        for name, seconds in sorted(modules.items(), key=lambda kv: kv[1], reverse=True)[:args.top]:
+            print(f"    {name:36s} {seconds:6.3f}s")
+
+
+if __name__ == "__main__":
+    main()
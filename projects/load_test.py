@@ -0,0 +1,293 @@
+#concurrent session load test for the pages, run from the repo root:
+#   python projects/load_test.py --sessions 1 2 4 8 --rounds 10
+#for every page and session count it starts one `streamlit run` server, warms its caches
+#with one untimed session, then connects that many websocket clients to it at once (each
+#one a browser tab as far as the server knows). every client changes a random sidebar
+#filter and times the rerun, from sending it to the server's script_finished message. it
+#prints rerun latency percentiles, reruns per second and the server's resident memory
+#growth per session, read from /proc (linux) while every client is still connected, so
+#the caches the sessions share count once and not per session.
+import argparse
+import asyncio
+import contextlib
+import datetime
+import glob
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+import numpy as np
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.RootContainer_pb2 import RootContainer
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from websockets.asyncio.client import connect
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+#the export controls in the sidebar don't change what the page computes
+EXPORT_KEY_SUFFIXES = ("_what", "_format")
+WIDGET_TYPES = ["date_input", "multiselect", "selectbox", "slider", "checkbox", "toggle", "radio"]
+FINISHED = (ForwardMsg.FINISHED_SUCCESSFULLY, ForwardMsg.FINISHED_WITH_COMPILE_ERROR) #not reruns cut short
+
+
+def _filters(at):
+    widgets = []
+    for kind in WIDGET_TYPES:
+        for widget in getattr(at.sidebar, kind):
+            if (widget.key or "").endswith(EXPORT_KEY_SUFFIXES):
+                continue
+            if kind in ("multiselect", "selectbox", "radio") and not widget.options:
+                continue
+            widgets.append((kind, widget))
+    return widgets
+
+
+def _random_dates(rng, low, high):
+    days = (high - low).days
+    a, b = sorted(rng.sample(range(days + 1), 2))
+    return low + datetime.timedelta(days=a), low + datetime.timedelta(days=b)
+
+
+def random_change(at, rng):
+    #Session.change for an AppTest (see payload.py): set one sidebar filter to a random valid
+    #value, returns its label (None if the page drew no filters, e.g. it stopped early)
+    widgets = _filters(at)
+    if not widgets:
+        return None
+    kind, widget = rng.choice(widgets)
+    if kind == "multiselect":
+        widget.set_value(rng.sample(widget.options, rng.randint(1, len(widget.options))))
+    elif kind in ("selectbox", "radio"):
+        widget.set_value(rng.choice(widget.options))
+    elif kind in ("checkbox", "toggle"):
+        widget.set_value(not widget.value)
+    elif kind == "date_input":
+        widget.set_value(_random_dates(rng, widget.min, widget.max))
+    elif kind == "slider":
+        values = list(range(int(widget.min), int(widget.max) + 1, int(widget.step or 1)))
+        if isinstance(widget.value, tuple):
+            widget.set_value(tuple(sorted(rng.sample(values, 2))))
+        else:
+            widget.set_value(rng.choice(values))
+    return widget.label
+
+
+PAGE_PREFIX = re.compile(r"^\d+_") #pages/1_Sales_Dashboard.py -> its url path, Sales_Dashboard
+SERVER_TIMEOUT = 120 #seconds for the server to come up and for one rerun
+
+
+def page_name(path):
+    return PAGE_PREFIX.sub("", os.path.splitext(os.path.basename(path))[0])
+
+
+def server_rss(pid):
+    #resident bytes of the server process
+    with open(f"/proc/{pid}/status") as fh:
+        for line in fh:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    raise RuntimeError(f"no VmRSS for process {pid}")
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def streamlit_server():
+    #a headless streamlit server for the app, yields (process, port)
+    port = _free_port()
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "streamlit", "run", os.path.join(PROJECT_DIR, "app.py"),
+            "--server.headless=true", f"--server.port={port}", "--server.fileWatcherType=none",
+            "--browser.gatherUsageStats=false", "--logger.level=error",
+        ],
+        cwd=os.path.dirname(PROJECT_DIR),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL, #page errors come back to the clients as exception elements
+    )
+    try:
+        deadline = time.time() + SERVER_TIMEOUT
+        while True:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=5):
+                    break
+            except OSError:
+                if process.poll() is not None or time.time() > deadline:
+                    raise RuntimeError(f"streamlit server didn't start (exit code {process.poll()})")
+                time.sleep(0.2)
+        yield process, port
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+class Session:
+    #one browser tab: a websocket to the server, the sidebar widgets of the last run and the
+    #widget values this tab has set (the server takes defaults for the others)
+    def __init__(self, port, page):
+        self.url = f"ws://127.0.0.1:{port}/_stcore/stream"
+        self.page = page
+        self.widgets = [] #(kind, proto) of the sidebar filters drawn by the last run
+        self.states = {} #widget id -> WidgetState
+        self._ws = None
+
+    async def open(self):
+        #connect and run the page once (untimed), returns its errors
+        self._ws = await connect(self.url, subprotocols=["streamlit"], max_size=None)
+        return await self.rerun()
+
+    async def close(self):
+        await self._ws.close()
+
+    async def rerun(self):
+        #send the current widget states, wait for the run to finish. returns its errors
+        msg = BackMsg()
+        msg.rerun_script.page_name = self.page
+        msg.rerun_script.widget_states.widgets.extend(self.states.values())
+        await self._ws.send(msg.SerializeToString())
+        widgets, errors = [], []
+        while True:
+            fwd = ForwardMsg()
+            fwd.ParseFromString(await asyncio.wait_for(self._ws.recv(), SERVER_TIMEOUT))
+            kind = fwd.WhichOneof("type")
+            if kind == "page_not_found":
+                raise RuntimeError(f"the server has no page {self.page!r}")
+            if kind == "delta" and fwd.delta.WhichOneof("type") == "new_element":
+                element = fwd.delta.new_element
+                etype = element.WhichOneof("type")
+                if etype == "exception":
+                    errors.append(element.exception.message)
+                elif fwd.metadata.delta_path[0] == RootContainer.SIDEBAR:
+                    kind = _kind(element, etype)
+                    proto = getattr(element, etype)
+                    if kind in WIDGET_TYPES and not proto.id.endswith(EXPORT_KEY_SUFFIXES):
+                        widgets.append((kind, proto))
+            elif kind == "script_finished" and fwd.script_finished in FINISHED:
+                self.widgets = widgets
+                return errors
+
+    def change(self, rng):
+        #set one sidebar filter to a random valid value (nothing if the page drew none)
+        widgets = [(k, w) for k, w in self.widgets if k not in ("multiselect", "selectbox", "radio") or w.options]
+        if not widgets:
+            return
+        kind, proto = rng.choice(widgets)
+        state = WidgetState(id=proto.id)
+        if kind == "multiselect":
+            state.string_array_value.data[:] = rng.sample(list(proto.options), rng.randint(1, len(proto.options)))
+        elif kind in ("selectbox", "radio"):
+            state.string_value = rng.choice(list(proto.options))
+        elif kind in ("checkbox", "toggle"):
+            current = self.states.get(proto.id)
+            state.bool_value = not (current.bool_value if current is not None else proto.default)
+        elif kind == "date_input":
+            low, high = (datetime.date.fromisoformat(d.replace("/", "-")) for d in (proto.min, proto.max))
+            dates = _random_dates(rng, low, high) if proto.is_range else [_random_dates(rng, low, high)[0]]
+            state.string_array_value.data[:] = [d.isoformat() for d in dates]
+        elif kind == "slider":
+            values = list(np.arange(proto.min, proto.max + proto.step / 2, proto.step or 1))
+            picked = sorted(rng.sample(values, 2)) if len(proto.default) == 2 else [rng.choice(values)]
+            state.double_array_value.data[:] = [float(v) for v in picked]
+        self.states[proto.id] = state
+
+
+def _kind(element, etype):
+    #WIDGET_TYPES name of a sidebar element, toggles are checkboxes with a type
+    if etype == "checkbox" and element.checkbox.type == element.checkbox.TOGGLE:
+        return "toggle"
+    return etype
+
+
+async def _timed(session, rng, rounds, latencies, errors):
+    for _ in range(rounds):
+        session.change(rng)
+        t0 = time.perf_counter()
+        try:
+            run_errors = await session.rerun()
+        except Exception as exc: #count it and keep going
+            errors.append(repr(exc))
+            continue
+        latencies.append(time.perf_counter() - t0)
+        errors.extend(run_errors[:1])
+
+
+async def _load(port, pid, page, sessions, rounds, seed):
+    #(latencies, errors, wall seconds, rss growth) for sessions tabs on the server
+    warm = Session(port, page) #fills the server's caches the timed sessions share
+    errors = await warm.open()
+    await _timed(warm, random.Random(seed), rounds, [], errors)
+    await warm.close()
+    await asyncio.sleep(1) #let the server drop the closed session's run
+
+    before = server_rss(pid)
+    tabs = [Session(port, page) for _ in range(sessions)]
+    for opened in await asyncio.gather(*(tab.open() for tab in tabs)):
+        errors.extend(opened[:1])
+    latencies = []
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        _timed(tab, random.Random(seed + 1 + i), rounds, latencies, errors) for i, tab in enumerate(tabs)
+    ))
+    wall = time.perf_counter() - started
+    growth = server_rss(pid) - before #every tab still connected
+    await asyncio.gather(*(tab.close() for tab in tabs))
+    return latencies, errors, wall, growth
+
+
+def run_load(path, sessions, rounds, seed=0):
+    #sessions concurrent tabs on one fresh server, with rounds random reruns each
+    with streamlit_server() as (process, port):
+        latencies, errors, wall, growth = asyncio.run(_load(port, process.pid, page_name(path), sessions, rounds, seed))
+
+    lat = np.array(latencies) * 1000
+    return {
+        "sessions": sessions,
+        "reruns": len(lat),
+        "p50_ms": float(np.percentile(lat, 50)) if len(lat) else float("nan"),
+        "p95_ms": float(np.percentile(lat, 95)) if len(lat) else float("nan"),
+        "p99_ms": float(np.percentile(lat, 99)) if len(lat) else float("nan"),
+        "reruns_per_s": len(lat) / wall if wall > 0 else float("nan"),
+        "session_mb": growth / sessions / 2**20,
+        "errors": errors,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate concurrent sessions against the dashboard pages.")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 2, 4, 8], help="session counts to try")
+    parser.add_argument("--rounds", type=int, default=10, help="filter changes per session")
+    parser.add_argument("--pages", nargs="*", help="page files to test (default: every page)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    pages = args.pages or sorted(glob.glob(os.path.join(PROJECT_DIR, "pages", "*.py")))
+
+    for page in pages:
+        path = os.path.abspath(page)
+        print(os.path.relpath(path, PROJECT_DIR))
+        print(
+            f"    {'sessions':>8s} {'reruns':>6s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s}"
+            f" {'rerun/s':>8s} {'MB/sess':>8s}"
+        )
+        for n in args.sessions:
+            r = run_load(path, n, args.rounds, args.seed)
+            print(
+                f"    {n:8d} {r['reruns']:6d} {r['p50_ms']:8.1f} {r['p95_ms']:8.1f} {r['p99_ms']:8.1f}"
+                f" {r['reruns_per_s']:8.2f} {r['session_mb']:8.2f}"
+            )
+            for error in r["errors"][:3]:
+                print(f"        error: {error}")
+
+
+if __name__ == "__main__":
+    main()
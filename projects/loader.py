@@ -1,28 +1,206 @@
-#standardize the way that data is read in for every file 
+#standardize the way that data is read in for every file
 # #and make load data into cache
-import pandas as pd
+#several datasets can be served at once (see registry.py); each session works on the one
+#picked with select_dataset(), every function below takes dataset= to override that
+import functools
+import os
+
+import numpy as np
 import streamlit as st
 
-@st.cache_data
-def load_data():
-    df = pd.read_csv(
-        "Data/train.csv",
-        parse_dates=["Order Date", "Ship Date"],
-        dayfirst=True,
-        dtype={
-            "Order ID": "category",
-            "Ship Mode": "category",
-            "Customer ID": "category",
-            "Segment": "category",
-            "Country": "category",
-            "City": "category",
-            "State": "category",
-            "Postal Code": "category",
-            "Region": "category",
-            "Product ID": "category",
-            "Category": "category",
-            "Sub-Category": "category",
-            "Product Name": "category",
-        },
-    )
-    return df
\ No newline at end of file
+from dataset import read_date_bounds, read_rows
+from partitions import list_partitions, prune
+from registry import MEMORY_BUDGET_MB, DatasetRegistry, configured_datasets
+from watcher import POLL_SECONDS, DatasetWatcher
+
+
+@st.cache_resource
+def dataset_registry():
+    #one registry per server process, its memory budget is shared by every dataset
+    return DatasetRegistry(configured_datasets(), MEMORY_BUDGET_MB * 2 ** 20)
+
+
+def default_dataset():
+    return dataset_registry().names()[0]
+
+
+def select_dataset():
+    #call once per page before loading anything: a sidebar picker when more than one
+    #dataset is configured. the choice is kept in session state so it follows the user
+    #from page to page
+    names = dataset_registry().names()
+    if st.session_state.get("dataset") not in names:
+        st.session_state["dataset"] = names[0]
+    if len(names) > 1:
+        st.session_state["_dataset"] = st.session_state["dataset"] #widget state is dropped on page changes
+        st.sidebar.selectbox("Dataset", names, key="_dataset", on_change=_keep_dataset)
+    return st.session_state["dataset"]
+
+
+def _keep_dataset():
+    st.session_state["dataset"] = st.session_state["_dataset"]
+
+
+def current_dataset():
+    return st.session_state.get("dataset") or default_dataset()
+
+
+def dataset_watcher(dataset=None):
+    return _watcher(dataset or current_dataset())
+
+
+@st.cache_resource
+def _watcher(name):
+    #one watcher per dataset, its version is part of every data cache key below
+    watcher = DatasetWatcher(dataset_registry().path(name), read_rows)
+    watcher.on_change.append(functools.partial(_warm_version, name))
+    return watcher.start()
+
+
+def data_version(dataset=None):
+    return dataset_watcher(dataset).version
+
+
+def _warm_version(name, version):
+    #runs on the watcher thread before version is published, so the first rerun after a
+    #change finds the new data already parsed instead of parsing it itself
+    _date_bounds(name, version)
+    _kpi_snapshot(name, version)
+    _date_index(name, version)
+    _star(name, version, _partition_files(name, None, None)) #the star pages on the full range use
+    _sample(name, version)
+
+
+def _full_data(name, version, columns=None, rows=None):
+    #the dataset at version as a new frame, just columns / row positions when given (the caller
+    #passes the version explicitly so the warm-up above can build the next version before it
+    #is published)
+    return dataset_registry().frame(name, version, columns, rows=rows)
+
+
+def _build_data(name, version, columns=None, paths=None):
+    #the columns a derived item (date index, star, sample) is built from, of just the
+    #partition files in paths when given. columns the pages haven't loaded are read for the
+    #build only, so the registry doesn't keep the wide columns next to the compact item made
+    #from them
+    return dataset_registry().frame(name, version, columns, paths=paths, keep=False)
+
+
+def load_data(start=None, end=None, dataset=None, columns=None):
+    #pass the page's date range so a partitioned dataset only reads what overlaps it, and
+    #the columns the page uses so only those are read and copied (all of them when None).
+    #the cache is keyed on the partitions picked, so nearby ranges share an entry.
+    #pages change the frame they get, so it is always their own copy
+    name = dataset or current_dataset()
+    return _load(name, data_version(name), start, end, columns)
+
+
+def _load(name, version, start, end, columns, rows=None):
+    paths = _partition_files(name, start, end)
+    if paths is None:
+        return _full_data(name, version, columns, rows)
+    return dataset_registry().frame(name, version, columns, paths=paths, rows=rows)
+
+
+def _partition_files(name, start, end):
+    #the partition files overlapping [start, end], None for a single file dataset
+    path = dataset_registry().path(name)
+    if not os.path.isdir(path):
+        return None
+    return tuple(p for p, _, _ in prune(list_partitions(path), start, end))
+
+
+def full_rows(df, start=None, end=None, dataset=None):
+    #for a frame from load_data(start, end, columns=...): a function taking a mask over df
+    #(None: every row) and returning just those rows with every dataset column, plus the
+    #ones the page added to df. nothing is read until it is called, so pass it to
+    #export_button and the other columns load on download only
+    name = dataset or current_dataset()
+    version = data_version(name)
+
+    def rows(mask=None):
+        positions = np.arange(len(df)) if mask is None else np.flatnonzero(np.asarray(mask, dtype=bool))
+        full = _load(name, version, start, end, None, positions)
+        added = [c for c in df.columns if c not in full.columns]
+        full[added] = df[added].iloc[positions] #same row labels as the taken dataset rows
+        return full
+
+    return rows
+
+
+def date_bounds(dataset=None):
+    #default / limits for the pages' date pickers
+    name = dataset or current_dataset()
+    return _date_bounds(name, data_version(name))
+
+
+@st.cache_data(max_entries=16) #small, current and previous version of a few datasets
+def _date_bounds(name, version):
+    return read_date_bounds(dataset_registry().path(name))
+
+
+def load_kpi_snapshot(dataset=None):
+    #the offline KPI snapshot for the dataset, None if it hasn't been built or is out of date
+    #(build it with: python projects/snapshot.py --data <its path>)
+    name = dataset or current_dataset()
+    return _kpi_snapshot(name, data_version(name))
+
+
+@st.cache_data(max_entries=16)
+def _kpi_snapshot(name, version):
+    from snapshot import load_snapshot
+    return load_snapshot(dataset_registry().path(name))
+
+
+@st.fragment(run_every=POLL_SECONDS)
+def refresh_on_change():
+    #call once per page: reruns the session when the watcher publishes a new data version
+    name = current_dataset()
+    seen_name, seen = st.session_state.setdefault("data_version", (name, data_version(name)))
+    version = data_version(name)
+    if (name, version) != (seen_name, seen):
+        st.session_state["data_version"] = (name, version)
+        if name == seen_name: #a dataset switch has rerun the page already
+            st.rerun(scope="app")
+
+
+def load_date_index(dataset=None):
+    #prefix-sum Sales / line / order totals per day for Segment x Region (see date_index.py)
+    name = dataset or current_dataset()
+    return _date_index(name, data_version(name))
+
+
+def _date_index(name, version): #read only arrays, shared across sessions without copying
+    from date_index import DATE_INDEX_COLUMNS, DateIndex
+    return dataset_registry().get(name, version, "date_index", lambda entry: DateIndex(_build_data(name, version, DATE_INDEX_COLUMNS)))
+
+
+def load_star(start=None, end=None, dataset=None):
+    #compact fact + dimension tables (see star_schema.py), pages join the columns they show.
+    #like load_data, pass the page's date range so a partitioned dataset only reads (and
+    #builds a star over) the files it overlaps; stars are kept per set of partitions picked
+    name = dataset or current_dataset()
+    return _star(name, data_version(name), _partition_files(name, start, end))
+
+
+def _star(name, version, paths=None): #shared read only; frame() always builds a new frame
+    from star_schema import STAR_COLUMNS, StarSchema
+    key = "star" if paths is None else ("star", paths)
+    return dataset_registry().get(name, version, key, lambda entry: StarSchema(_build_data(name, version, STAR_COLUMNS, paths)))
+
+
+def load_sample(dataset=None):
+    #stratified order sample for the pages' approximate-first mode (see sampling.py)
+    name = dataset or current_dataset()
+    return _sample(name, data_version(name))
+
+
+def _sample(name, version):
+    from sampling import StratifiedSample
+    return dataset_registry().get(name, version, "sample", lambda entry: StratifiedSample(_build_data(name, version)))
+
+
+def dataset_stats():
+    #per dataset memory / load time table and (used, budget) bytes for the whole process
+    registry = dataset_registry()
+    return registry.stats(), registry.used_bytes(), registry.budget_bytes
@@ -0,0 +1,234 @@
+#compute logic shared by the dashboard pages
+#nothing in here touches streamlit so it can be imported by the pages, the notebook and
+#the batch report renderer alike. every function takes the frame from loader.load_data
+import pandas as pd
+
+from dataset import MISSING_DAY
+from sharded import executor
+
+#full state name -> postal abbreviation (used by the choropleths)
+STATE_TO_ABBREV = {
+    "Alabama": "AL", "Alaska": "AK", "Arizona": "AZ", "Arkansas": "AR",
+    "California": "CA", "Colorado": "CO", "Connecticut": "CT",
+    "Delaware": "DE", "District of Columbia": "DC", "Florida": "FL",
+    "Georgia": "GA", "Hawaii": "HI", "Idaho": "ID", "Illinois": "IL",
+    "Indiana": "IN", "Iowa": "IA", "Kansas": "KS", "Kentucky": "KY",
+    "Louisiana": "LA", "Maine": "ME", "Maryland": "MD", "Massachusetts": "MA",
+    "Michigan": "MI", "Minnesota": "MN", "Mississippi": "MS", "Missouri": "MO",
+    "Montana": "MT", "Nebraska": "NE", "Nevada": "NV", "New Hampshire": "NH",
+    "New Jersey": "NJ", "New Mexico": "NM", "New York": "NY",
+    "North Carolina": "NC", "North Dakota": "ND", "Ohio": "OH",
+    "Oklahoma": "OK", "Oregon": "OR", "Pennsylvania": "PA",
+    "Rhode Island": "RI", "South Carolina": "SC", "South Dakota": "SD",
+    "Tennessee": "TN", "Texas": "TX", "Utah": "UT", "Vermont": "VT",
+    "Virginia": "VA", "Washington": "WA", "West Virginia": "WV",
+    "Wisconsin": "WI", "Wyoming": "WY"
+}
+
+#contiguous 48 + DC
+CONTIGUOUS_STATES = [
+    "AL","AZ","AR","CA","CO","CT","DE","DC","FL","GA","ID","IL","IN","IA","KS","KY",
+    "LA","ME","MD","MA","MI","MN","MS","MO","MT","NE","NV","NH","NJ","NM","NY","NC",
+    "ND","OH","OK","OR","PA","RI","SC","SD","TN","TX","UT","VT","VA","WA","WV","WI","WY"
+]
+
+DEFAULT_LATE_THRESHOLD = 3 #days, same default as the shipping page slider
+
+
+def filter_mask(df, segments=None, regions=None, ship_modes=None, categories=None, start=None, end=None):
+    #the filter every page builds from its sidebar, None means "don't filter on this"
+    #start / end are inclusive and can be anything pd.to_datetime understands
+    mask = pd.Series(True, index=df.index)
+
+    if start is not None:
+        mask &= df["Order Date"] >= pd.to_datetime(start)
+    if end is not None:
+        mask &= df["Order Date"] <= pd.to_datetime(end)
+    if segments is not None:
+        mask &= df["Segment"].isin(segments)
+    if regions is not None:
+        mask &= df["Region"].isin(regions)
+    if ship_modes is not None:
+        mask &= df["Ship Mode"].isin(ship_modes)
+    if categories is not None:
+        mask &= df["Category"].isin(categories)
+
+    return mask
+
+
+def group_agg(df, by, **named):
+    #df.groupby(by, observed=True).agg(**named). on big frames the distinct counts, sizes and
+    #min / max go to the sharded process pool when they merge across shards (see sharded.py),
+    #sums and the rest run here
+    return split_agg(executor(), df, by, named)
+
+
+def split_agg(sharded, df, by, named):
+    #group_agg on the given executor: sums stay on pandas, which the sharded merge can't match
+    #to the last bit, and are joined back on the group keys
+    by = [by] if isinstance(by, str) else list(by)
+    sums = {name: spec for name, spec in named.items() if spec[1] == "sum"}
+    rest = {name: spec for name, spec in named.items() if name not in sums}
+    if not rest or not sharded.wanted(df, by, rest):
+        return df.groupby(by, observed=True).agg(**named)
+    result = sharded.agg(df, by, **rest)
+    if sums: #same groups on both sides: every row with no missing key
+        result = pd.concat([result, df.groupby(by, observed=True).agg(**sums)], axis=1)[list(named)]
+    return result
+
+
+#sales page
+def sales_kpis(filtered):
+    total_sales = filtered["Sales"].sum()
+    total_orders = filtered["Order ID"].nunique()
+    return {
+        "total_sales": total_sales,
+        "total_orders": total_orders,
+        "avg_order_value": total_sales / max(total_orders, 1),
+    }
+
+
+def sales_by(filtered, col):
+    #total sales per value of col, biggest first
+    return group_agg(filtered, col, Sales=("Sales", "sum"))["Sales"].sort_values(ascending=False)
+
+
+#customer spend page
+def top_customers(seg_df):
+    #customers ranked by total sales with a 1 based Rank column
+    ranked = group_agg(
+        seg_df,
+        ["Customer ID", "Customer Name"],
+        Total_Sales=("Sales", "sum"),
+        Num_Orders=("Order ID", "nunique"),
+        Lines=("Sales", "size"),
+    )
+    ranked["Avg_Order_Value"] = ranked["Total_Sales"] / ranked.pop("Lines") #per line, as it always was
+    ranked = ranked.sort_values("Total_Sales", ascending=False).reset_index()
+    ranked["Rank"] = ranked.index + 1 #humans don't think from 0 index traditionally, display from 1
+    return ranked
+
+
+#map page
+def state_summary(filtered):
+    #per state totals for the contiguous 48 + DC with the abbreviation the map needs
+    state_agg = group_agg( #rows without a State drop out of the group-by
+        filtered,
+        "State",
+        Total_Sales=("Sales", "sum"),
+        Num_Sales=("Order ID", "nunique"),
+        Num_Customers=("Customer ID", "nunique"),
+    ).reset_index()
+
+    state_agg["Avg_Sale"] = state_agg["Total_Sales"] / state_agg["Num_Sales"].replace(0, 1)
+    state_agg["state_abbrev"] = state_agg["State"].map(STATE_TO_ABBREV)
+
+    return state_agg[state_agg["state_abbrev"].isin(CONTIGUOUS_STATES)].copy()
+
+
+def state_kpis(state_df):
+    total_sales = state_df["Sales"].sum()
+    num_sales = state_df["Order ID"].nunique()
+    num_customers = state_df["Customer ID"].nunique()
+    return {
+        "total_sales": total_sales,
+        "num_sales": num_sales,
+        "num_customers": num_customers,
+        "avg_sale": total_sales / max(num_sales, 1),
+        "avg_orders_per_customer": num_sales / max(num_customers, 1),
+        "avg_sales_per_customer": total_sales / max(num_customers, 1),
+    }
+
+
+def segment_stats(state_df):
+    seg_stats = group_agg(
+        state_df,
+        "Segment",
+        Total_Sales=("Sales", "sum"),
+        Num_Sales=("Order ID", "nunique"),
+        Num_Customers=("Customer ID", "nunique"),
+    ).reset_index()
+
+    seg_stats["Avg_Sale"] = seg_stats["Total_Sales"] / seg_stats["Num_Sales"].replace(0, 1)
+    seg_stats["Avg_Orders_per_Customer"] = seg_stats["Num_Sales"] / seg_stats["Num_Customers"].replace(0, 1)
+    return seg_stats
+
+
+#shipping page
+def delay_days(df):
+    #shipping delay in whole days per line, from the int32 day numbers read_data adds
+    #(frames without them, e.g. star schema joins, fall back to the dates)
+    if "Order Day" not in df.columns or "Ship Day" not in df.columns:
+        return (df["Ship Date"] - df["Order Date"]).dt.days
+    delay = df["Ship Day"] - df["Order Day"]
+    known = (df["Ship Day"] != MISSING_DAY) & (df["Order Day"] != MISSING_DAY)
+    return delay if known.all() else delay.where(known)
+
+
+def order_level(filtered, threshold_days=DEFAULT_LATE_THRESHOLD):
+    #each order counted once; an order is late if ANY line is late.
+    #expects a Delay_Days column (see delay_days)
+    lines = filtered.assign(Is_Late=filtered["Delay_Days"] > threshold_days)
+    return group_agg(
+        lines,
+        "Order ID",
+        OrderDate=("Order Date", "min"),
+        Delay_Days=("Delay_Days", "max"),   # worst delay in the order
+        Is_Late=("Is_Late", "max"),         # True if any line is late
+    ).reset_index()
+
+
+def shipping_kpis(orders):
+    total_orders = len(orders)
+    late_orders_count = int(orders["Is_Late"].sum())
+    return {
+        "total_orders": total_orders,
+        "late_orders": late_orders_count,
+        "avg_delay": orders["Delay_Days"].mean(),
+        "p95_delay": orders["Delay_Days"].quantile(0.95),
+        "pct_late": late_orders_count / total_orders * 100 if total_orders > 0 else 0.0,
+    }
+
+
+def late_over_time(orders):
+    #late and total orders per order month
+    orders = orders.assign(OrderMonth=orders["OrderDate"].dt.to_period("M").dt.to_timestamp())
+    monthly = group_agg( #pull out number of orders that were late and the total number of orders
+        orders,
+        "OrderMonth",
+        total_orders=("Order ID", "nunique"),
+        late_orders=("Is_Late", "sum"),
+    ).reset_index()
+    monthly["pct_late"] = monthly["late_orders"] / monthly["total_orders"] * 100 #create the percentage
+    return monthly
+
+
+#sales over time page
+def sales_over_time(filtered, freq, by_category=False):
+    #resampled sales with a Period column ready to plot, one line per Category if asked
+    indexed = filtered.set_index("Order Date")
+
+    if by_category:
+        series = (
+            indexed
+            .groupby("Category", observed=True)["Sales"]
+            .resample(freq)
+            .sum()
+            .reset_index()
+        )
+    else:
+        series = (
+            indexed["Sales"]
+            .resample(freq)
+            .sum()
+            .to_frame(name="Sales")
+            .reset_index()
+        )
+        series["Category"] = "All Categories" #dummy so plotting code can stay simple
+
+    if freq == "D":
+        series["Period"] = series["Order Date"]
+    else:
+        series["Period"] = series["Order Date"].dt.to_period(freq).dt.to_timestamp()
+
+    return series
@@ -1,7 +1,13 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-from loader import load_data
+from loader import load_star, load_kpi_snapshot, load_date_index, date_bounds, select_dataset, refresh_on_change
+from export import export_button
+from metrics import filter_mask
+from aggregates import sales_by #shared on-disk cache, see aggregates.py
+from snapshot import is_standard
+import progressive
+import warmup
+
+warmup.start()
 
 
 #setup the page
@@ -9,16 +15,30 @@ st.set_page_config(
     page_title="Sales",
     layout="wide"
 )
+select_dataset() #which dataset this session works on, see registry.py
+refresh_on_change() #rerun when the data files change
 
 #Page title
 st.title("Sales")
 
-#Load data
-df = load_data()
+snap = load_kpi_snapshot() #precomputed numbers for the default filters
 
 #Filters
 st.sidebar.title("Filters")
 
+#date range first, a partitioned dataset then only reads the files it overlaps
+date_range = st.sidebar.date_input( #add a dateinput that selects date range
+    "Order Date range", #title it
+    value=date_bounds() #default it to the min and max of the date range
+)
+
+#Load data, only the columns this page uses are joined from the star schema
+df = load_star(date_range[0], date_range[-1]).frame(
+    ["Order ID", "Order Date", "Segment", "Region", "Category", "Sales"],
+    date_range[0],
+    date_range[-1],
+)
+
 #segments
 segments = st.sidebar.multiselect(
     "Segment", #title it
@@ -31,18 +51,60 @@ regions = st.sidebar.multiselect(
     options=sorted(df["Region"].dropna().unique()), #drop the non unique values
     default=sorted(df["Region"].dropna().unique()) #default all selected
 )
-#date range
-date_range = st.sidebar.date_input( #add a dateinput that selects date range
-    "Order Date range", #title it
-    value=(df["Order Date"].min(), df["Order Date"].max()) #default it to the min and max of the date range
-)
+#period over period comparison, answered from the prefix-sum date index
+compare_options = {
+    "Nothing": None,
+    "Previous period": "previous",
+    "Previous quarter": "quarter",
+    "Same period last year": "year",
+}
+compare_to = st.sidebar.selectbox("Compare to", options=list(compare_options.keys()))
+approximate = progressive.toggle() #estimate the charts first, see progressive.py
 
 #apply filters
-filtered = df[ #us isin and and between combined with & to stack the variety of filters.
-    df["Segment"].isin(segments) 
-    & df["Region"].isin(regions)
-    & (df["Order Date"].between(pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1])))
-]
+mask = filter_mask( #isin and between stacked together, see metrics.filter_mask
+    df,
+    segments=segments,
+    regions=regions,
+    start=date_range[0],
+    end=date_range[1],
+)
+
+if not mask.any(): #e.g. a single day with no orders for the picked segments / regions
+    st.warning("No data available for the selected filters.")
+    st.stop()
+
+#default filters are served from the snapshot (nothing below groups the rows then), anything
+#else is looked up in the date index (two prefix sums per segment/region pair instead of a
+#scan over the rows)
+standard = is_standard(snap, segments=segments, regions=regions, start=date_range[0], end=date_range[-1])
+filtered = None if standard else df[mask]
+
+def index_kpis(totals):
+    return {
+        "total_sales": totals["sales"],
+        "total_orders": totals["orders"],
+        "avg_order_value": totals["sales"] / max(totals["orders"], 1),
+    }
+
+index = load_date_index()
+index_filters = {"Segment": segments, "Region": regions}
+if standard:
+    kpis = snap["kpis"]
+else:
+    kpis = index_kpis(index.totals(date_range[0], date_range[-1], index_filters))
+
+#deltas against the comparison period, if one was picked
+deltas = {"total_sales": None, "total_orders": None, "avg_order_value": None}
+if compare_options[compare_to]:
+    _, previous, (prev_start, prev_end) = index.compare(
+        date_range[0], date_range[-1], index_filters, against=compare_options[compare_to]
+    )
+    previous = index_kpis(previous)
+    for key in deltas:
+        if previous[key]:
+            deltas[key] = f"{(kpis[key] - previous[key]) / previous[key] * 100:+.1f}%"
+    st.caption(f"Change vs {prev_start.date()} → {prev_end.date()}")
 
 #KPIs
 st.title("Sales") 
@@ -52,37 +114,61 @@ col1, col2, col3 = st.columns(3) #set it up with columns
 with col1: #target column 1
     st.metric(
         "Total Sales",
-        f"${filtered['Sales'].sum():,.2f}" #use the filtered data frame to make sure it is the right subset.
+        f"${kpis['total_sales']:,.2f}", #use the filtered data frame to make sure it is the right subset.
+        delta=deltas["total_sales"],
     )
 
 with col2: #target column 2
     st.metric(
         "Total Orders",
-        f"{filtered['Order ID'].nunique():,}" #use the filtered data frame to make sure it is the right subset.
+        f"{kpis['total_orders']:,}", #use the filtered data frame to make sure it is the right subset.
+        delta=deltas["total_orders"],
     )
 
 with col3: #target column 3
     st.metric(
         "Average Order Value",
-        f"${(filtered['Sales'].sum() / max(filtered['Order ID'].nunique(), 1)):,.2f}" #use the filtered data frame to make sure it is the right subset.
+        f"${kpis['avg_order_value']:,.2f}", #use the filtered data frame to make sure it is the right subset.
+        delta=deltas["avg_order_value"],
     )
 
 st.markdown("---")
 
+#chart tables: the snapshot for the default filters, otherwise grouped from the filtered rows.
+#in approximate-first mode a slow grouping finishes in the background and the charts show
+#sample estimates with 95% intervals (yerr) until it is done
+def chart_tables(filtered):
+    return sales_by(filtered, "Category"), sales_by(filtered, "Region")
+
+yerr = {"Category": None, "Region": None}
+if standard:
+    sales_by_cat = snap["tables"]["sales_by_category"]["Sales"]
+    sales_by_region = snap["tables"]["sales_by_region"]["Sales"]
+elif approximate:
+    params = (tuple(segments), tuple(regions), tuple(date_range))
+    tables = progressive.exact("sales_charts", chart_tables, filtered, params=params)
+    if tables is None:
+        sample, lines = progressive.sample_lines(segments=segments, regions=regions, start=date_range[0], end=date_range[-1])
+        estimates = {col: sample.totals(lines, [col]).sort_values("estimate", ascending=False) for col in yerr}
+        sales_by_cat, sales_by_region = (estimates[col]["estimate"].rename("Sales") for col in yerr)
+        yerr = {col: estimates[col]["high"] - estimates[col]["estimate"] for col in yerr}
+        progressive.refining("sales_charts", params)
+    else:
+        sales_by_cat, sales_by_region = tables
+else:
+    sales_by_cat, sales_by_region = chart_tables(filtered)
+
 #charts
+import matplotlib.pyplot as plt #deferred until a chart is actually drawn
+
 left_col, right_col = st.columns(2) #create two columns for 2 charts side by side
 
 #sales by category
 with left_col: #target left colum 
     st.subheader("Sales by Category")
-    sales_by_cat = (
-        filtered.groupby("Category", observed=True)["Sales"]
-        .sum()
-        .sort_values(ascending=False)
-    )
 
     fig1, ax1 = plt.subplots() #need to use subplot to return the figure and axes
-    sales_by_cat.plot(kind="bar", ax=ax1)
+    sales_by_cat.plot(kind="bar", ax=ax1, yerr=yerr["Category"])
 
     ax1.set_xlabel("Category")
     ax1.set_ylabel("Sales ($)")
@@ -94,14 +180,9 @@ with left_col: #target left colum
 #sales by region
 with right_col: #target right column
     st.subheader("Sales by Region")
-    sales_by_region = (
-        filtered.groupby("Region", observed=True)["Sales"]
-        .sum()
-        .sort_values(ascending=False)
-    )
 
     fig2, ax2 = plt.subplots()
-    sales_by_region.plot(kind="bar", ax=ax2)
+    sales_by_region.plot(kind="bar", ax=ax2, yerr=yerr["Region"])
 
     ax2.set_xlabel("Region")
     ax2.set_ylabel("Sales ($)")
@@ -110,3 +191,11 @@ with right_col: #target right column
 
     st.pyplot(fig2)
 
+#export the rows behind the charts or the chart tables themselves
+export_button(
+    df,
+    mask,
+    name="sales",
+    #estimates aren't offered, only the exact tables
+    tables={} if yerr["Category"] is not None else {"Sales by Category": sales_by_cat, "Sales by Region": sales_by_region},
+)
@@ -1,7 +1,13 @@
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-from loader import load_data   # shared data loader
+from loader import load_star, date_bounds, dataset_watcher, select_dataset, refresh_on_change   # shared data loader
+from export import export_button
+from tables import html_table
+from payload import compact #smaller chart specs, see payload.py
+from metrics import filter_mask
+from aggregates import top_customers as rank_customers #shared on-disk cache, see aggregates.py
+import warmup
+
+warmup.start()
 
 
 #setup the page
@@ -9,15 +15,27 @@ st.set_page_config(
     page_title="Customer Spend Dashboard",
     layout="wide"
 )
-#Load data
-df = load_data()
-
+select_dataset() #which dataset this session works on, see registry.py
+refresh_on_change() #rerun when the data files change
 #page title
 st.title("Customer Spend Dashboard")
 
 #filters
 st.sidebar.header("Filters")
 
+#date range first, a partitioned dataset then only reads the files it overlaps
+date_range = st.sidebar.date_input(
+    "Order Date Range",
+    value=date_bounds()
+)
+
+#Load data, only the columns this page uses are joined from the star schema
+df = load_star(date_range[0], date_range[-1]).frame(
+    ["Order ID", "Order Date", "Customer ID", "Customer Name", "Segment", "Sales"],
+    date_range[0],
+    date_range[-1],
+)
+
 #segment selector
 all_segments = sorted(df["Segment"].dropna().unique())
 default_segments = [s for s in all_segments if s in ["Corporate", "Home Office"]]
@@ -28,17 +46,8 @@ selected_segments = st.sidebar.multiselect(
     default=default_segments,
 )
 
-#date range
-date_range = st.sidebar.date_input(
-    "Order Date Range",
-    value=(df["Order Date"].min(), df["Order Date"].max())
-)
-
 #generate the mask for use later
-mask = df["Order Date"].between(
-    pd.to_datetime(date_range[0]),
-    pd.to_datetime(date_range[1])
-)
+mask = filter_mask(df, start=date_range[0], end=date_range[1])
 df_filtered = df[mask]
 
 #give the range of customer ranks and ability to select upper and lower bound
@@ -61,6 +70,8 @@ if (max_rank - min_rank + 1) > 25:
 st.markdown("---") #draw a line to visually break
 st.subheader("Top Customers by Segment") 
 
+top_tables = {} #ranked tables per segment, offered as exports at the bottom
+
 #plots
 if not selected_segments:
     st.info("Select at least one segment from the sidebar to see results.") #if they haven't made a selection have them make one
@@ -75,19 +86,8 @@ else:
             continue
 
         
-        top_customers = ( #generate the top customers table from the datafram put together for the segments
-            seg_df.groupby(["Customer ID", "Customer Name"], observed=True)
-                  .agg(
-                      Total_Sales=("Sales", "sum"),
-                      Num_Orders=("Order ID", "nunique"),
-                      Avg_Order_Value=("Sales", lambda x: x.sum() / max(len(x), 1)),
-                  )
-                  .sort_values("Total_Sales", ascending=False)
-                  .reset_index()
-        )
-
-        
-        top_customers["Rank"] = top_customers.index + 1 #humans don't think from 0 index traditionally, display from 1
+        top_customers = rank_customers(seg_df) #generate the top customers table from the datafram put together for the segments
+        top_tables[f"Top Customers {seg}"] = top_customers
 
     
         filtered_customers = top_customers[ #go between the two ranks and pull out the 25
@@ -109,6 +109,8 @@ else:
         })
 
         # ---------- Charts (use filtered customers) ----------
+        import matplotlib.pyplot as plt #deferred until a chart is actually drawn
+
         col1, col2 = st.columns(2)
 
         #chart 1: Total Sales
@@ -140,24 +142,94 @@ else:
              "Num Orders", "Total Sales", "Avg Order Value"]
         ]
 
-        styled_table = ( #format so it looks nice
-            display_df.style
-                .hide(axis="index")
-                .set_table_styles([
-                    {"selector": "th",
-                     "props": [("font-size", "24px"),
-                               ("text-align", "center")]},
-                    {"selector": "td",
-                     "props": [("font-size", "18px")]}
-                ])
-                .set_properties(subset=["Total Sales"], **{"text-align": "right"})
-                .set_properties(subset=["Avg Order Value"], **{"text-align": "right"})
-                .set_properties(subset=["Num Orders"], **{"text-align": "center"})
-                .format({
-                    "Total Sales": "${:,.2f}".format,
-                    "Avg Order Value": "${:,.2f}".format,
-                })
+        table_html = html_table( #format so it looks nice, see tables.py
+            display_df,
+            formats={"Total Sales": "money", "Avg Order Value": "money"},
+            align={"Total Sales": "right", "Avg Order Value": "right", "Num Orders": "center"},
+            header_css={"font-size": "24px", "text-align": "center"},
+            cell_css={"font-size": "18px"},
         )
 
-        st.markdown(styled_table.to_html(), unsafe_allow_html=True) 
+        st.markdown(table_html, unsafe_allow_html=True)
         st.markdown("---")
+
+#cohort and RFM views over every order, kept up to date by the dataset watcher as rows
+#arrive (customers.py), so changing these views never regroups the line items
+st.subheader("Customer Cohorts and RFM")
+aggregates = dataset_watcher().aggregates
+if not selected_segments:
+    pass #already asked for a segment above
+elif aggregates is None:
+    st.info("The customer analytics are still reading the order history.")
+elif aggregates.customers.as_of() is None:
+    st.info("There are no dated orders to analyse yet.")
+else:
+    customers = aggregates.customers
+    st.caption(
+        f"Every order up to {customers.as_of():%Y-%m-%d} for the selected segments, the date range "
+        f"doesn't apply. Recency is days since a customer's last order; R / F / M are quintile scores "
+        f"(5 best) among the customers shown."
+    )
+    import plotly.express as px #deferred until a chart is actually drawn
+
+    cohort_tab, rfm_tab = st.tabs(["Cohort retention", "RFM"])
+
+    with cohort_tab:
+        as_share = st.radio(
+            "Show",
+            ["% of cohort", "Customers"],
+            horizontal=True,
+            key="cohort_view",
+        ) == "% of cohort"
+        cohorts = customers.retention(selected_segments) if as_share else customers.cohorts(selected_segments)
+        if cohorts.empty: #no customer in the selected segments
+            st.info("No customers in the selected segments.")
+        else:
+            cohorts.index = cohorts.index.strftime("%Y-%m")
+            fig = px.imshow(
+                cohorts * 100 if as_share else cohorts,
+                aspect="auto",
+                color_continuous_scale="Blues",
+                labels={
+                    "x": "Months Since First Order",
+                    "y": "First Order Month",
+                    "color": "% of Cohort" if as_share else "Customers",
+                },
+                title="Customers Ordering Again, by Month of First Order",
+            )
+            st.plotly_chart(compact(fig), use_container_width=True)
+            top_tables["Cohort Retention" if as_share else "Cohort Customers"] = cohorts
+
+    with rfm_tab:
+        rfm = customers.rfm(selected_segments)
+        grid = rfm.pivot_table(index="R", columns="F", values="Monetary", aggfunc="size", fill_value=0)
+        fig = px.imshow(
+            grid.sort_index(ascending=False),
+            text_auto=True,
+            color_continuous_scale="Blues",
+            labels={"x": "Frequency Score", "y": "Recency Score", "color": "Customers"},
+            title="Customers by Recency and Frequency Score",
+        )
+        st.plotly_chart(compact(fig), use_container_width=True)
+
+        rfm_table = rfm.head(25).copy() #same 25 row cap as the ranked tables above
+        for col in ["First Order", "Last Order"]:
+            rfm_table[col] = rfm_table[col].dt.date
+        st.caption("Top 25 customers by Monetary value")
+        st.markdown(
+            html_table(
+                rfm_table.drop(columns=["Segment"]),
+                formats={"Monetary": "money"},
+                align={"Recency": "right", "Frequency": "right", "Monetary": "right", "RFM": "center"},
+            ),
+            unsafe_allow_html=True,
+        )
+        top_tables["RFM Scores"] = rfm
+
+#export the date filtered rows for the selected segments, or a segment's ranked table
+export_button(
+    df,
+    mask & df["Segment"].isin(selected_segments),
+    name="customer_spend",
+    tables=top_tables,
+)
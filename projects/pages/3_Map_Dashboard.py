@@ -1,209 +1,206 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
 
-from loader import load_data  # shared train.csv loader
+from loader import load_data, full_rows, load_kpi_snapshot, date_bounds, select_dataset, refresh_on_change  # shared train.csv loader
+from export import export_button
+from tables import html_table, money
+from metrics import CONTIGUOUS_STATES, STATE_TO_ABBREV, filter_mask, state_kpis
+from aggregates import state_summary, segment_stats #shared on-disk cache, see aggregates.py
+from snapshot import is_standard
+from sampling import estimated_state_summary
+from sections import Sections
+import progressive
+import warmup
 
 
+warmup.start()
+
 #setup the page
 st.set_page_config(
     page_title="State Breakdown",
     layout="wide"
 )
-
-#Load data
-df = load_data()
+select_dataset() #which dataset this session works on, see registry.py
+refresh_on_change() #rerun when the data files change
 
 st.title("State Breakdown")
 
 #Filters
 st.sidebar.header("Filters")
 
+#date range first, a partitioned dataset then only reads the files it overlaps
+date_range = st.sidebar.date_input( #add a dateinput that selects date range
+    "Order Date range", #title it
+    value=date_bounds() #default it to the min and max of the date range
+)
+
+#Load data
+COLUMNS = ["Order ID", "Order Date", "Order Day", "Customer ID", "Segment", "State", "Sales"] #what this page reads, see loader.load_data
+df = load_data(date_range[0], date_range[-1], columns=COLUMNS)
+
 #segments
 selected_segments = st.sidebar.multiselect(
     "Segment", #title it
     options=sorted(df["Segment"].dropna().unique()), #drop the non unique values
     default=sorted(df["Segment"].dropna().unique()) #default all selected
 )
+approximate = progressive.toggle() #estimate the maps first, see progressive.py
 
-#date range
-date_range = st.sidebar.date_input( #add a dateinput that selects date range
-    "Order Date range", #title it
-    value=(df["Order Date"].min(), df["Order Date"].max()) #default it to the min and max of the date range
-)
-df["Order Date"] = pd.to_datetime(df["Order Date"])
-
-mask = df["Order Date"].between(
-    pd.to_datetime(date_range[0]),
-    pd.to_datetime(date_range[1])
+mask = filter_mask(
+    df,
+    segments=selected_segments or None, #nothing selected means no segment filter
+    start=date_range[0],
+    end=date_range[1],
 )
 
-if selected_segments:
-    mask &= df["Segment"].isin(selected_segments)
-
-df_filtered = df[mask].copy() #make sure it is it's own data frame and no objects inside it are editing objects in other places
-
-if df_filtered.empty:
+if not mask.any():
     st.info("No data for the current filters.")
     st.stop()
 
 
-# ---------- Manual state mapping (full name -> abbreviation) ----------
-state_to_abbrev = {
-    "Alabama": "AL", "Alaska": "AK", "Arizona": "AZ", "Arkansas": "AR",
-    "California": "CA", "Colorado": "CO", "Connecticut": "CT",
-    "Delaware": "DE", "District of Columbia": "DC", "Florida": "FL",
-    "Georgia": "GA", "Hawaii": "HI", "Idaho": "ID", "Illinois": "IL",
-    "Indiana": "IN", "Iowa": "IA", "Kansas": "KS", "Kentucky": "KY",
-    "Louisiana": "LA", "Maine": "ME", "Maryland": "MD", "Massachusetts": "MA",
-    "Michigan": "MI", "Minnesota": "MN", "Mississippi": "MS", "Missouri": "MO",
-    "Montana": "MT", "Nebraska": "NE", "Nevada": "NV", "New Hampshire": "NH",
-    "New Jersey": "NJ", "New Mexico": "NM", "New York": "NY",
-    "North Carolina": "NC", "North Dakota": "ND", "Ohio": "OH",
-    "Oklahoma": "OK", "Oregon": "OR", "Pennsylvania": "PA",
-    "Rhode Island": "RI", "South Carolina": "SC", "South Dakota": "SD",
-    "Tennessee": "TN", "Texas": "TX", "Utah": "UT", "Vermont": "VT",
-    "Virginia": "VA", "Washington": "WA", "West Virginia": "WV",
-    "Wisconsin": "WI", "Wyoming": "WY"
-}
-
-
-# ---------- State-level aggregation ----------
-state_agg = (
-    df_filtered
-        .dropna(subset=["State"])
-        .groupby("State", observed=True)
-        .agg(
-            Total_Sales=("Sales", "sum"),
-            Num_Sales=("Order ID", "nunique"),
-            Num_Customers=("Customer ID", "nunique")
+# ---------- State-level aggregation (contiguous 48 + DC) ----------
+snap = load_kpi_snapshot()
+standard = is_standard(snap, segments=selected_segments or None, start=date_range[0], end=date_range[1])
+#the filtered rows are only copied out when the state totals have to be grouped from them
+df_filtered = None if standard else df[mask].copy()
+estimated = False #True while the maps show sample estimates in approximate-first mode
+if standard:
+    state_agg = snap["tables"]["state_summary"].copy() #default filters come straight from the snapshot
+elif approximate:
+    params = (tuple(selected_segments), tuple(date_range))
+    state_agg = progressive.exact("state_summary", state_summary, df_filtered, params=params)
+    if state_agg is None:
+        sample, lines = progressive.sample_lines(segments=selected_segments or None, start=date_range[0], end=date_range[1])
+        state_agg = estimated_state_summary(sample, lines)
+        estimated = True
+else:
+    state_agg = None #worked out with the maps on the section pool below
+
+
+def map_figures(state_agg, df_filtered):
+    #state totals (if not known yet) and the choropleth, runs on the section pool
+    import plotly.graph_objects as go #deferred until a chart is actually drawn
+
+    if state_agg is None:
+        state_agg = state_summary(df_filtered)
+
+    # Format labels for tooltip
+    if estimated: #estimate with its 95% interval
+        state_agg["Num_Sales"] = state_agg["Num_Sales"].round().astype(int)
+        for col in ["Total_Sales", "Avg_Sale"]:
+            x, lo, hi = (money(state_agg[c]).astype(object) for c in [col, f"{col}_Low", f"{col}_High"])
+            state_agg[f"{col}_Label"] = "≈" + x + " (" + lo + " – " + hi + ")"
+    else:
+        state_agg["Total_Sales_Label"] = money(state_agg["Total_Sales"])
+        state_agg["Avg_Sale_Label"] = money(state_agg["Avg_Sale"])
+
+    #one trace per metric, each carrying its values once: the Total Sales trace holds the hover
+    #fields, the Number of Sales trace is laid over it without hover (plotly passes hover through
+    #"skip" traces) and the buttons only toggle visibility and color bars on the client
+    hover = [("Number of Sales", "Num_Sales", "%{customdata[0]:,}")]
+    if not estimated: #not estimated from the sample
+        hover.append(("Number of Customers", "Num_Customers", "%{customdata[1]:,}"))
+    hover += [
+        ("Average Sale", "Avg_Sale_Label", f"%{{customdata[{len(hover)}]}}"),
+        ("Total Sales ($)", "Total_Sales_Label", f"%{{customdata[{len(hover) + 1}]}}"),
+    ]
+    metrics = { #button label -> colored column, color scale
+        "Total Sales": ("Total_Sales", "Reds"),
+        "Number of Sales": ("Num_Sales", "Blues"),
+    }
+
+    fig_map = go.Figure([
+        go.Choropleth(
+            locations=state_agg["state_abbrev"],
+            locationmode="USA-states",
+            z=state_agg[col].to_numpy(dtype=float),
+            colorscale=scale,
+            colorbar=dict(title=dict(text=label)),
+            **(dict(
+                text=state_agg["State"],
+                customdata=state_agg[[c for _, c, _ in hover]].to_numpy(dtype=object),
+                hovertemplate="<b>%{text}</b><br>" + "<br>".join(f"{name}={fmt}" for name, _, fmt in hover) + "<extra></extra>",
+            ) if i == 0 else dict(hoverinfo="skip", visible=False, showscale=False)),
         )
-        .reset_index()
-)
+        for i, (label, (col, scale)) in enumerate(metrics.items())
+    ])
 
-state_agg["Avg_Sale"] = state_agg["Total_Sales"] / state_agg["Num_Sales"].replace(0, 1)
-state_agg["state_abbrev"] = state_agg["State"].map(state_to_abbrev)
-
-# Keep only contiguous 48 + DC
-contiguous_states = [
-    "AL","AZ","AR","CA","CO","CT","DE","DC","FL","GA","ID","IL","IN","IA","KS","KY",
-    "LA","ME","MD","MA","MI","MN","MS","MO","MT","NE","NV","NH","NJ","NM","NY","NC",
-    "ND","OH","OK","OR","PA","RI","SC","SD","TN","TX","UT","VT","VA","WA","WV","WI","WY"
-]
-
-state_agg = state_agg[state_agg["state_abbrev"].isin(contiguous_states)].copy()
-
-# Format labels for tooltip
-state_agg["Total_Sales_Label"] = state_agg["Total_Sales"].map(lambda x: f"${x:,.2f}")
-state_agg["Avg_Sale_Label"] = state_agg["Avg_Sale"].map(lambda x: f"${x:,.2f}")
-
-
-#heatmap total sales
-st.subheader("US State Heatmap (Total Sales) – Contiguous 48 Only")
-
-fig_sales = px.choropleth(
-    state_agg,
-    locations="state_abbrev",
-    locationmode="USA-states",
-    color="Total_Sales",
-    color_continuous_scale="Reds",
-    hover_name="State",
-    labels={"Total_Sales_Label": "Total Sales ($)",
-            "Num_Sales": "Number of Sales",
-            "Avg_Sale_Label": "Average Sale",
-            "Num_Customers": "Number of Customers",
-            },
-    hover_data={
-        "Num_Sales": True,
-        "Num_Customers": True,
-        "Avg_Sale_Label": True,
-        "Total_Sales_Label": True,
-        "Total_Sales": False
-    }
-)
+    fig_map.update_geos(
+        projection_type="mercator",
+        scope="north america",
+        lataxis_range=[24, 50],
+        lonaxis_range=[-125, -66],
+        showcountries=False,
+        showsubunits=True
+    )
 
-fig_sales.update_geos(
-    projection_type="mercator",
-    scope="north america",
-    lataxis_range=[24, 50],
-    lonaxis_range=[-125, -66],
-    showcountries=False,
-    showsubunits=True
-)
+    fig_map.update_layout(
+        margin=dict(l=0, r=0, t=30, b=0),
+        height=500,
+        updatemenus=[dict(
+            type="buttons",
+            direction="right",
+            x=0, y=1.08, xanchor="left", yanchor="top",
+            buttons=[
+                dict(
+                    label=label,
+                    method="restyle",
+                    args=[{ #the base trace stays drawn underneath so its hover keeps working
+                        "visible": [j == 0 or j == i for j in range(len(metrics))],
+                        "showscale": [j == i for j in range(len(metrics))],
+                    }],
+                )
+                for i, label in enumerate(metrics)
+            ],
+        )],
+    )
 
-fig_sales.update_layout(
-    margin=dict(l=0, r=0, t=30, b=0),
-    height=500
-)
+    return state_agg, fig_map
 
-st.plotly_chart(fig_sales, use_container_width=True)
-
-
-#heatmap number of sales
-st.subheader("US State Heatmap (Number of Sales) – Contiguous 48 Only")
-
-fig_orders = px.choropleth(
-    state_agg,
-    locations="state_abbrev",
-    locationmode="USA-states",
-    color="Num_Sales",
-    color_continuous_scale="Blues",
-    hover_name="State",
-    labels={"Total_Sales_Label": "Total Sales ($)",
-            "Num_Sales": "Number of Sales",
-            "Avg_Sale_Label": "Average Sale",
-            "Num_Customers": "Number of Customers",
-            },
-    hover_data={ #unify the hover data
-        "Num_Sales": True,
-        "Num_Customers": True,
-        "Avg_Sale_Label": True,
-        "Total_Sales_Label": True
-    }
-)
 
-fig_orders.update_geos(
-    projection_type="mercator",
-    scope="north america",
-    lataxis_range=[24, 50],
-    lonaxis_range=[-125, -66],
-    showcountries=False,
-    showsubunits=True
-)
+def draw_maps(result):
+    _, fig_map = result
+    st.subheader("US State Heatmap (Total Sales / Number of Sales) – Contiguous 48 Only")
+    st.plotly_chart(fig_map, use_container_width=True)
 
-fig_orders.update_layout(
-    margin=dict(l=0, r=0, t=30, b=0),
-    height=500
-)
 
-st.plotly_chart(fig_orders, use_container_width=True)
+#the maps are the slow part, so they are built on the section pool while the state detail
+#below is drawn; their placeholder comes first to keep the layout
+sections = Sections()
+if estimated:
+    progressive.refining("state_summary", params)
+maps = sections.add(st.empty(), map_figures, draw_maps, state_agg, df_filtered, label="maps")
 
 
 #state detail dropwdown
 st.markdown("---")
 st.subheader("State Detail – Sales & Ordering Habits")
 
-available_states = state_agg["State"].sort_values().unique().tolist()
+available_states = sorted( #the states the maps show, without waiting for them
+    state for state in df.loc[mask, "State"].dropna().unique()
+    if STATE_TO_ABBREV.get(state) in CONTIGUOUS_STATES
+)
 
 selected_state = st.selectbox(
     "Select a state for detailed statistics:",
     options=available_states
 )
 
-state_df = df_filtered[df_filtered["State"] == selected_state].copy()
+state_df = df[mask & (df["State"] == selected_state)].copy() #just the picked state's rows
 
 if state_df.empty:
     st.info("No data for the selected state with the current filters.")
+    sections.render()
     st.stop()
 
 
 #state KPI
-total_sales = state_df["Sales"].sum()
-num_sales = state_df["Order ID"].nunique()
-num_customers = state_df["Customer ID"].nunique()
-avg_sale = total_sales / max(num_sales, 1)
-avg_orders_per_customer = num_sales / max(num_customers, 1)
-avg_sales_per_customer = total_sales / max(num_customers, 1)
+kpis = state_kpis(state_df)
+total_sales = kpis["total_sales"]
+num_sales = kpis["num_sales"]
+num_customers = kpis["num_customers"]
+avg_sale = kpis["avg_sale"]
+avg_orders_per_customer = kpis["avg_orders_per_customer"]
+avg_sales_per_customer = kpis["avg_sales_per_customer"]
 
 col1, col2, col3 = st.columns(3)
 with col1:
@@ -225,57 +222,45 @@ with col6:
 #segment breakdwon in state
 st.markdown("#### Segment Breakdown for Selected State")
 
-seg_stats = (
-    state_df
-    .groupby("Segment", observed=True)
-    .agg(
-        Total_Sales=("Sales", "sum"),
-        Num_Sales=("Order ID", "nunique"),
-        Num_Customers=("Customer ID", "nunique")
-    )
-    .reset_index()
-)
 
-seg_stats["Avg_Sale"] = seg_stats["Total_Sales"] / seg_stats["Num_Sales"].replace(0, 1)
-seg_stats["Avg_Orders_per_Customer"] = seg_stats["Num_Sales"] / seg_stats["Num_Customers"].replace(0, 1)
-
-# Format for display
-seg_display = seg_stats.copy()
-seg_display["Total_Sales"] = seg_display["Total_Sales"].map(lambda x: f"${x:,.2f}")
-seg_display["Avg_Sale"] = seg_display["Avg_Sale"].map(lambda x: f"${x:,.2f}")
-seg_display["Avg_Orders_per_Customer"] = seg_display["Avg_Orders_per_Customer"].map(lambda x: f"{x:,.2f}")
-
-# Rename columns
-seg_display = seg_display.rename(columns={
-    "Segment": "Segment",
-    "Num_Sales": "Num Sales",
-    "Num_Customers": "Num Customers",
-    "Avg_Orders_per_Customer": "Avg Orders per Customer",
-    "Total_Sales": "Total Sales",
-    "Avg_Sale": "Avg Sale"
-})
-
-# Column order
-seg_display = seg_display[
-    ["Segment", "Num Sales", "Num Customers",
-     "Avg Orders per Customer", "Total Sales", "Avg Sale"]
-]
-
-# Style the table
-styled = (
-    seg_display.style
-    .hide(axis="index")
-    .set_table_styles([
-        {"selector": "th", "props": [("text-align", "center"), ("font-size", "18px")]}
-    ])
-    .set_properties(
-        subset=["Num Sales", "Num Customers", "Avg Orders per Customer"],
-        **{"text-align": "center"}
-    )
-    .set_properties(
-        subset=["Total Sales", "Avg Sale"],
-        **{"text-align": "right"}
+def segment_table(state_df):
+    #segment stats for the state as an html table, runs on the section pool
+    seg_display = segment_stats(state_df).rename(columns={
+        "Segment": "Segment",
+        "Num_Sales": "Num Sales",
+        "Num_Customers": "Num Customers",
+        "Avg_Orders_per_Customer": "Avg Orders per Customer",
+        "Total_Sales": "Total Sales",
+        "Avg_Sale": "Avg Sale"
+    })
+
+    # Column order
+    seg_display = seg_display[
+        ["Segment", "Num Sales", "Num Customers",
+         "Avg Orders per Customer", "Total Sales", "Avg Sale"]
+    ]
+
+    return html_table( #formatted a column at a time, see tables.py
+        seg_display,
+        formats={"Total Sales": "money", "Avg Sale": "money", "Avg Orders per Customer": "decimal"},
+        align={
+            "Num Sales": "center", "Num Customers": "center", "Avg Orders per Customer": "center",
+            "Total Sales": "right", "Avg Sale": "right",
+        },
+        header_css={"text-align": "center", "font-size": "18px"},
     )
-)
 
-st.markdown(styled.to_html(), unsafe_allow_html=True)
+sections.add(st.empty(), segment_table, lambda html: st.markdown(html, unsafe_allow_html=True), state_df, label="segment breakdown")
+
+#fill the maps and the segment table in as they finish
+sections.render()
+
+#export the filtered rows or the state totals that feed the maps (exact totals only)
+state_agg = maps.result()[0]
+export_button(
+    df,
+    mask,
+    name="state_breakdown",
+    tables={} if estimated else {"State Totals": state_agg[["State", "Total_Sales", "Num_Sales", "Num_Customers", "Avg_Sale"]]},
+    full_rows=full_rows(df, date_range[0], date_range[-1]), #every column of the filtered rows
+)
@@ -1,28 +1,59 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
-import plotly.express as px
 
-from loader import load_data  # shared train.csv loader
+from loader import load_data, full_rows, load_kpi_snapshot, date_bounds, dataset_watcher, select_dataset, refresh_on_change  # shared train.csv loader
+from export import export_button
+from snapshot import is_standard
+from sections import Sections
+from payload import compact #smaller chart specs, see payload.py
+from sla import MIN_ORDERS, TARGET_LATE_RATE, WINDOWS
+from tables import html_table
+import warmup
+from metrics import filter_mask, delay_days, shipping_kpis
+from aggregates import order_level as to_order_level, late_over_time as monthly_late #shared on-disk cache, see aggregates.py
 
 
+warmup.start()
+
 #setup the page
 st.set_page_config(
     page_title="Shipping Delay KPI Dashboard",
     layout="wide"
 )
+select_dataset() #which dataset this session works on, see registry.py
+refresh_on_change() #rerun when the data files change
 
 #Page title
 st.title("Shipping Delay KPI Dashboard")
 
-#Load data
-df = load_data()
+#Filters
+st.sidebar.header("Filters")
+
+# Date range filter, picked first so a partitioned dataset only reads the files it overlaps
+min_date, max_date = (d.date() for d in date_bounds())
+
+date_range = st.sidebar.date_input(
+    "Order Date Range",
+    value=(min_date, max_date),
+    min_value=min_date,
+    max_value=max_date,
+)
+
+if isinstance(date_range, tuple) and len(date_range) == 2:
+    start_date, end_date = date_range
+else:
+    start_date, end_date = min_date, max_date
 
-#clean up datetime
-for col in ["Order Date", "Ship Date"]:
-    df[col] = pd.to_datetime(df[col])
+#Load data
+COLUMNS = [ #what this page reads, see loader.load_data
+    "Order ID", "Order Date", "Ship Date", "Order Day", "Ship Day", "Ship Mode", "Customer ID",
+    "Customer Name", "Segment", "Region", "State", "City", "Sales",
+]
+df = load_data(start_date, end_date, columns=COLUMNS)
 
-#Compute shipping delay in days
-df["Delay_Days"] = (df["Ship Date"] - df["Order Date"]).dt.days
+#Compute shipping delay in days (dates and day numbers come parsed from the loader)
+df["Delay_Days"] = delay_days(df)
 
 
 
@@ -33,9 +64,6 @@ assess whether your shipping is meeting KPI targets.
 """
 )
 
-#Filters
-st.sidebar.header("Filters")
-
 # Segment filter
 segments = sorted(df["Segment"].dropna().unique()) if "Segment" in df.columns else [] #if regions is not a column set as empty list
 if segments:#if regions is not an empty list set selected regions based on this
@@ -69,22 +97,6 @@ if ship_modes:
 else:
     selected_ship_modes = ship_modes
 
-# Date range filter
-min_date = df["Order Date"].min().date()
-max_date = df["Order Date"].max().date()
-
-date_range = st.sidebar.date_input(
-    "Order Date Range",
-    value=(min_date, max_date),
-    min_value=min_date,
-    max_value=max_date,
-)
-
-if isinstance(date_range, tuple) and len(date_range) == 2:
-    start_date, end_date = date_range
-else:
-    start_date, end_date = min_date, max_date
-
 # KPI threshold slider (late if Delay_Days > threshold)
 max_delay = int(df["Delay_Days"].max()) if not df["Delay_Days"].isna().all() else 0
 if max_delay < 1:
@@ -99,18 +111,15 @@ threshold_days = st.sidebar.slider(
 )
 
 #apply filters
-mask = (
-    (df["Order Date"].dt.date >= start_date)
-    & (df["Order Date"].dt.date <= end_date)
+mask = filter_mask(
+    df,
+    segments=selected_segments if segments else None, #only filter on columns that exist
+    regions=selected_regions if regions else None,
+    ship_modes=selected_ship_modes if ship_modes else None,
+    start=start_date,
+    end=end_date,
 )
 
-if segments: #if there is a filter for segments not an empty list
-    mask &= df["Segment"].isin(selected_segments)
-if regions: #if there is a filter for regions not an empty
-    mask &= df["Region"].isin(selected_regions)
-if ship_modes: #if there is a filter for ship modes, not an empty list
-    mask &= df["Ship Mode"].isin(selected_ship_modes)
-
 filtered = df[mask].copy()
 
 if filtered.empty: #don't leave the user hanging on information
@@ -119,22 +128,29 @@ if filtered.empty: #don't leave the user hanging on information
 
 filtered["Is_Late"] = filtered["Delay_Days"] > threshold_days #set is late to a boolean on the number of days elapsed
 
+#default filters and threshold are served from the snapshot (the order level group-by below
+#is skipped then), anything else is computed live
+snap = load_kpi_snapshot()
+standard = is_standard(
+    snap,
+    segments=selected_segments if segments else None,
+    regions=selected_regions if regions else None,
+    ship_modes=selected_ship_modes if ship_modes else None,
+    start=start_date,
+    end=end_date,
+    threshold_days=threshold_days,
+)
+
 #tabular view
 # Each order counted once; an order is late if ANY line is late.
-if "Order ID" in filtered.columns:
-    order_level = (
-        filtered
-        .groupby("Order ID", as_index=False)
-        .agg(
-            OrderDate=("Order Date", "min"),
-            Delay_Days=("Delay_Days", "max"),   # worst delay in the order
-            Is_Late=("Is_Late", "max")          # True if any line is late
-        )
-    )
-else:
-    order_level = pd.DataFrame(columns=["Order ID", "OrderDate", "Delay_Days", "Is_Late"])
+def orders_of(filtered):
+    if "Order ID" in filtered.columns:
+        return to_order_level(filtered, threshold_days)
+    return pd.DataFrame(columns=["Order ID", "OrderDate", "Delay_Days", "Is_Late"])
 
-if order_level.empty:
+order_level = None if standard else orders_of(filtered)
+
+if order_level is not None and order_level.empty:
     st.warning("No valid order-level records found after filtering.")
     st.stop()
 
@@ -142,11 +158,15 @@ if order_level.empty:
 st.subheader("Shipping KPI Overview")
 
 # KPIs based on unique orders
-total_orders = len(order_level)
-late_orders_count = int(order_level["Is_Late"].sum())
-avg_delay = order_level["Delay_Days"].mean()
-p95_delay = order_level["Delay_Days"].quantile(0.95)
-pct_late = late_orders_count / total_orders * 100 if total_orders > 0 else 0.0
+if standard:
+    kpis = {k[len("shipping_"):]: v for k, v in snap["kpis"].items() if k.startswith("shipping_")}
+else:
+    kpis = shipping_kpis(order_level)
+total_orders = kpis["total_orders"]
+late_orders_count = kpis["late_orders"]
+avg_delay = kpis["avg_delay"]
+p95_delay = kpis["p95_delay"]
+pct_late = kpis["pct_late"]
 
 col1, col2, col3, col4, col5 = st.columns(5)
 col1.metric("Total Orders", f"{total_orders:,}")
@@ -155,22 +175,86 @@ col3.metric("95th Percentile Delay (days)", f"{p95_delay:.2f}")
 col4.metric("Late Orders", f"{late_orders_count:,}")       # absolute count
 col5.metric("% Orders Late", f"{pct_late:.1f}%")           # order-level %
 
-#charts
-st.subheader("Delay Distributions")
+#rolling SLA over the newest orders, kept up to date by the dataset watcher as rows arrive
+#(sla.py), so nothing here scans the history
+st.subheader("Rolling Shipping SLA")
+aggregates = dataset_watcher().aggregates
+if aggregates is None:
+    st.info("The SLA monitor is still reading the order history.")
+elif aggregates.sla.as_of() is None: #no order with both dates yet
+    st.info("There are no shipped orders to monitor yet.")
+else:
+    sla = aggregates.sla
+    sla_state = sla.state()
+    shown = ( #the page's ship mode / region filters apply, its dates and threshold don't
+        sla_state["Ship Mode"].isin(selected_ship_modes if ship_modes else sla_state["Ship Mode"])
+        & sla_state["Region"].isin(selected_regions if regions else sla_state["Region"])
+    )
+    sla_state = sla_state[shown]
+
+    sla_cols = st.columns(2 * len(WINDOWS))
+    for i, w in enumerate(WINDOWS):
+        orders_w, late_w = sla_state[f"Orders {w}d"].sum(), sla_state[f"Late {w}d"].sum()
+        sla_cols[i].metric(f"% Late, last {w} days", f"{100 * late_w / orders_w:.1f}%" if orders_w else "–")
+        sla_cols[len(WINDOWS) + i].metric(
+            f"In breach, last {w} days", f"{int(sla_state[f'Breach {w}d'].sum())} of {len(sla_state)}"
+        )
+    st.caption(
+        f"As of orders placed on {sla.as_of():%Y-%m-%d}. An order is late when it ships after its "
+        f"Ship Mode's SLA ({', '.join(f'{m}: {d} days' for m, d in sla.sla_days.items())}); a Ship Mode "
+        f"and Region is in breach while more than {TARGET_LATE_RATE:.0%} of at least {MIN_ORDERS} "
+        f"orders in the window are late."
+    )
 
-c1, c2 = st.columns(2)
+    sla_table = sla_state[["Ship Mode", "Region", "SLA Days"]].copy()
+    for w in WINDOWS:
+        sla_table[f"Orders ({w}d)"] = sla_state[f"Orders {w}d"]
+        sla_table[f"% Late ({w}d)"] = 100 * sla_state[f"Late Rate {w}d"]
+        sla_table[f"Status ({w}d)"] = sla_state[f"Breach {w}d"].map({True: "BREACH", False: "ok"})
+    st.markdown(
+        html_table(
+            sla_table,
+            formats={f"% Late ({w}d)": "decimal" for w in WINDOWS},
+            align={c: "right" for c in sla_table.columns[2:]},
+        ),
+        unsafe_allow_html=True,
+    )
 
-with c1:
-    st.markdown("**Distribution of Shipping Delay (line-item level)**") #histogram of number of orders and how many days. Colored based on late or not.
-    fig_hist = px.histogram(
-        filtered,
+    with st.expander("SLA breach events"):
+        events = sla.breach_events()
+        events = events[
+            events["Ship Mode"].isin(sla_state["Ship Mode"]) & events["Region"].isin(sla_state["Region"])
+        ].head(50)
+        if events.empty:
+            st.caption("No breaches recorded.")
+        else:
+            events = events.assign(Day=events["Day"].dt.date, **{"Late Rate": 100 * events["Late Rate"]})
+            st.markdown(
+                html_table(
+                    events.rename(columns={"Late Rate": "% Late"}),
+                    formats={"% Late": "decimal"},
+                    align={"% Late": "right", "Orders": "right"},
+                ),
+                unsafe_allow_html=True,
+            )
+
+#charts and the late order table are built on the section pool (sections.py) and drawn as
+#they finish; the KPIs above are already on screen by then
+def delay_histogram(filtered):
+    #delays are whole days, so the bars are counted here and only the counts are sent
+    import plotly.express as px #deferred until a chart is actually drawn
+
+    counts = filtered.groupby(["Delay_Days", "Is_Late"]).size().reset_index(name="Lines")
+    fig_hist = px.bar(
+        counts,
         x="Delay_Days",
+        y="Lines",
         color="Is_Late",
-        nbins=20,
         barmode="overlay",
         labels={
             "Delay_Days": "Shipping Delay (days)",
-            "Is_Late": f"Late (> {threshold_days} days)"
+            "Is_Late": f"Late (> {threshold_days} days)",
+            "Lines": "count",
         },
         title="Shipping Delay Distribution",
         color_discrete_map={
@@ -178,52 +262,54 @@ with c1:
             True:  "#00008B"    # dark blue for LATE
         }
     )
-    fig_hist.update_layout(legend_title_text="Late?")
-    st.plotly_chart(fig_hist, use_container_width=True)
-
-with c2: #show a box plot with tails and also plot the occurences next to it.
-    if "Ship Mode" in filtered.columns:
-        st.markdown("**Delay by Ship Mode (line-item level)**")
-        fig_box = px.box(
-            filtered,
-            x="Ship Mode",
-            y="Delay_Days",
-            points="all", #add the overlaid dots
-            labels={
-                "Ship Mode": "Ship Mode",
-                "Delay_Days": "Shipping Delay (days)"
-            },
-            title="Shipping Delay by Ship Mode"
-        )
-        st.plotly_chart(fig_box, use_container_width=True)
-    else:
-        st.info("No `Ship Mode` column found in data.")
+    fig_hist.update_layout(legend_title_text="Late?", bargap=0)
+    return compact(fig_hist)
 
-#second row of charts
-st.subheader("Late Orders Over Time (Order-level)")
 
-order_level["OrderMonth"] = (
-    order_level["OrderDate"].dt.to_period("M").dt.to_timestamp()
-)
+def delay_box(filtered):
+    #box statistics per ship mode are worked out here, and the points are one marker per
+    #distinct delay sized by its line count instead of every line item
+    import plotly.graph_objects as go
 
-late_over_time = ( #pull out number of orders that were late and the total number of orders
-    order_level
-    .groupby("OrderMonth", observed=False)
-    .agg(
-        total_orders=("Order ID", "nunique"),
-        late_orders=("Is_Late", "sum"),
+    delays = filtered.dropna(subset=["Delay_Days"]).groupby("Ship Mode", observed=True)["Delay_Days"]
+    q1, median, q3 = (delays.quantile(q) for q in (0.25, 0.5, 0.75))
+    low, high = q1 - 1.5 * (q3 - q1), q3 + 1.5 * (q3 - q1)
+    in_fence = filtered["Delay_Days"].between(
+        filtered["Ship Mode"].map(low).astype(float), filtered["Ship Mode"].map(high).astype(float)
     )
-    .reset_index()
-)
-late_over_time["pct_late"] = (
-    late_over_time["late_orders"] / late_over_time["total_orders"] * 100 #create the percentage
-)
+    fences = filtered[in_fence].groupby("Ship Mode", observed=True)["Delay_Days"].agg(["min", "max"])
+    points = filtered.groupby(["Ship Mode", "Delay_Days"], observed=True).size().reset_index(name="Lines")
+
+    fig = go.Figure([
+        go.Box(
+            x=median.index.astype(str),
+            q1=q1.to_numpy(), median=median.to_numpy(), q3=q3.to_numpy(),
+            lowerfence=fences["min"].reindex(median.index).to_numpy(),
+            upperfence=fences["max"].reindex(median.index).to_numpy(),
+            name="Delay", showlegend=False,
+        ),
+        go.Scatter(
+            x=points["Ship Mode"].astype(str),
+            y=points["Delay_Days"].to_numpy(),
+            mode="markers",
+            marker=dict(size=(6 + 24 * np.sqrt(points["Lines"] / points["Lines"].max())).to_numpy(), opacity=0.5),
+            customdata=points["Lines"].to_numpy(),
+            hovertemplate="%{x}<br>%{y} days: %{customdata} line items<extra></extra>",
+            showlegend=False,
+        ),
+    ])
+    fig.update_layout(
+        title="Shipping Delay by Ship Mode",
+        xaxis_title="Ship Mode",
+        yaxis_title="Shipping Delay (days)",
+    )
+    return compact(fig)
 
-c3, c4 = st.columns(2)
 
-# % Late over time (line)
-with c3:
-    fig_time_pct = px.line(
+def late_pct_line(late_over_time):
+    import plotly.express as px
+
+    return compact(px.line(
         late_over_time,
         x="OrderMonth",
         y="pct_late",
@@ -233,12 +319,13 @@ with c3:
             "pct_late": "% Orders Late",
         },
         title="% of Late Orders Over Time (Order-level)",
-    )
-    st.plotly_chart(fig_time_pct, use_container_width=True)
+    ))
 
-# Late orders by absolute count (bar)
-with c4:
-    fig_time_count = px.bar(
+
+def late_count_bar(late_over_time):
+    import plotly.express as px
+
+    return compact(px.bar(
         late_over_time,
         x="OrderMonth",
         y="late_orders",
@@ -247,16 +334,15 @@ with c4:
             "late_orders": "Late Orders (count)",
         },
         title="Late Orders (Count) Over Time (Order-level)",
-    )
-    st.plotly_chart(fig_time_count, use_container_width=True)
+    ))
 
-# table
-st.subheader(f"Orders Exceeding Threshold (> {threshold_days} days)")
 
-late_orders_df = filtered[filtered["Is_Late"]].copy()
-if late_orders_df.empty:
-    st.success("Great! No orders exceed the late threshold for the current filters.")
-else:
+def late_table(filtered):
+    #late line items, longest delay first, as a styled frame (None if there are none)
+    late_orders_df = filtered[filtered["Is_Late"]].copy()
+    if late_orders_df.empty:
+        return None
+
     # Choose a set of useful columns if they exist
     cols = []
     for col in [
@@ -282,10 +368,8 @@ else:
         if dcol in table.columns:
             table[dcol] = table[dcol].dt.date
 
-    st.caption("Showing late line-items (sorted by longest delay).") #this does not dynamically update if the user changes sort
-
     # Use Styler to format Sales as dollars and right-align
-    styled_table = (
+    return (
         table
         .reset_index(drop=True)
         .style
@@ -294,8 +378,70 @@ else:
                         **{"text-align": "right"})    # right-align Sales
     )
 
+
+def draw_chart(fig):
+    st.plotly_chart(fig, use_container_width=True)
+
+
+def draw_late_table(styled_table):
+    if styled_table is None:
+        st.success("Great! No orders exceed the late threshold for the current filters.")
+        return
+
+    st.caption("Showing late line-items (sorted by longest delay).") #this does not dynamically update if the user changes sort
     st.dataframe(
         styled_table,
         use_container_width=True,
         hide_index=True,
-    )
\ No newline at end of file
+    )
+
+
+sections = Sections()
+
+st.subheader("Delay Distributions")
+
+c1, c2 = st.columns(2)
+
+with c1:
+    st.markdown("**Distribution of Shipping Delay (line-item level)**") #histogram of number of orders and how many days. Colored based on late or not.
+    sections.add(st.empty(), delay_histogram, draw_chart, filtered, label="delay distribution")
+
+with c2: #show a box plot with tails and also plot the occurences next to it.
+    if "Ship Mode" in filtered.columns:
+        st.markdown("**Delay by Ship Mode (line-item level)**")
+        sections.add(st.empty(), delay_box, draw_chart, filtered, label="delay by ship mode")
+    else:
+        st.info("No `Ship Mode` column found in data.")
+
+#second row of charts
+st.subheader("Late Orders Over Time (Order-level)")
+
+late_over_time = snap["tables"]["late_over_time"] if standard else monthly_late(order_level) #late and total orders per month
+
+#export the filtered line items or the order level / monthly tables
+export_button(
+    df,
+    mask,
+    name="shipping_delay",
+    tables={ #the snapshot has no order level table, it is grouped if picked for export
+        "Order Level": (lambda: orders_of(filtered)) if standard else order_level,
+        "Late Orders by Month": late_over_time,
+    },
+    full_rows=full_rows(df, start_date, end_date), #every column of the filtered rows
+)
+
+c3, c4 = st.columns(2)
+
+# % Late over time (line)
+with c3:
+    sections.add(st.empty(), late_pct_line, draw_chart, late_over_time, label="late orders over time")
+
+# Late orders by absolute count (bar)
+with c4:
+    sections.add(st.empty(), late_count_bar, draw_chart, late_over_time, label="late order counts")
+
+# table
+st.subheader(f"Orders Exceeding Threshold (> {threshold_days} days)")
+sections.add(st.empty(), late_table, draw_late_table, filtered, label="late orders")
+
+sections.render()
@@ -1,20 +1,25 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 
-from loader import load_data  # shared train.csv loader
+from loader import load_data, full_rows, load_kpi_snapshot, date_bounds, select_dataset, refresh_on_change  # shared train.csv loader
+from export import export_button
+from snapshot import is_standard
+import warmup
+from metrics import filter_mask
+from aggregates import sales_over_time as sales_over_time_for #shared on-disk cache, see aggregates.py
+from sampling import estimated_sales_over_time
+import progressive
+from payload import compact, render_mode #smaller chart specs, see payload.py
+
+warmup.start()
 
 #setup the page
 st.set_page_config(
     page_title="Sales Over Time",
     layout="wide"
 )
-
-# ---------- Load & prepare data ----------
-df = load_data().copy()
-
-# Make sure Order Date is datetime
-df["Order Date"] = pd.to_datetime(df["Order Date"])
+select_dataset() #which dataset this session works on, see registry.py
+refresh_on_change() #rerun when the data files change
 
 st.title("Sales Over Time")
 
@@ -45,6 +50,46 @@ agg_choice = st.sidebar.selectbox(
 )
 freq = agg_label_to_freq[agg_choice]
 
+#dates, picked before loading so a partitioned dataset only reads the files they overlap
+min_ts, max_ts = date_bounds()
+min_date, max_date = min_ts.date(), max_ts.date()
+
+date_range = st.sidebar.date_input(
+    "Order Date Range",
+    value=(min_date, max_date),
+    min_value=min_date,
+    max_value=max_date,
+)
+
+# Handle single-date vs range input
+if isinstance(date_range, tuple) and len(date_range) == 2:
+    start_date_raw, end_date_raw = date_range
+else:
+    start_date_raw = end_date_raw = date_range #if only one date was selected, start, end, and range are all equal
+
+# Align the selected dates to full periods for the chosen aggregation
+start_ts_raw = pd.to_datetime(start_date_raw)
+end_ts_raw = pd.to_datetime(end_date_raw)
+
+start_period = pd.Period(start_ts_raw, freq=freq)
+end_period = pd.Period(end_ts_raw, freq=freq)
+
+aligned_start = start_period.start_time
+aligned_end = end_period.end_time
+
+# Clip to dataset bounds just in case
+aligned_start = max(aligned_start, min_ts)
+aligned_end = min(aligned_end, max_ts)
+
+if (aligned_start.date() != start_date_raw) or (aligned_end.date() != end_date_raw): #if you are modifying the date range let the user know
+    st.caption(
+        f"Date range aligned to full **{agg_choice.lower()}** periods: "
+        f"{aligned_start.date()} → {aligned_end.date()}."
+    )
+
+# ---------- Load & prepare data ----------
+COLUMNS = ["Order ID", "Order Date", "Order Day", "Segment", "Region", "Category", "Sales"] #what this page reads, see loader.load_data
+df = load_data(aligned_start, aligned_end, columns=COLUMNS) #already a private copy with parsed dates
 
 # Segment filter (if present)
 segments = sorted(df["Segment"].dropna().unique()) if "Segment" in df.columns else []#if regions is not a column set as empty list
@@ -84,53 +129,17 @@ show_by_category = st.sidebar.checkbox(
     "Show separate lines by Category",
     value=False
 )
-
-#dates
-min_date = df["Order Date"].min().date()
-max_date = df["Order Date"].max().date()
-
-date_range = st.sidebar.date_input(
-    "Order Date Range",
-    value=(min_date, max_date),
-    min_value=min_date,
-    max_value=max_date,
-)
-
-# Handle single-date vs range input
-if isinstance(date_range, tuple) and len(date_range) == 2:
-    start_date_raw, end_date_raw = date_range
-else:
-    start_date_raw = end_date_raw = date_range #if only one date was selected, start, end, and range are all equal
-
-# Align the selected dates to full periods for the chosen aggregation
-start_ts_raw = pd.to_datetime(start_date_raw)
-end_ts_raw = pd.to_datetime(end_date_raw)
-
-start_period = pd.Period(start_ts_raw, freq=freq)
-end_period = pd.Period(end_ts_raw, freq=freq)
-
-aligned_start = start_period.start_time
-aligned_end = end_period.end_time
-
-# Clip to dataset bounds just in case
-aligned_start = max(aligned_start, df["Order Date"].min())
-aligned_end = min(aligned_end, df["Order Date"].max())
-
-if (aligned_start.date() != start_date_raw) or (aligned_end.date() != end_date_raw): #if you are modifying the date range let the user know
-    st.caption(
-        f"Date range aligned to full **{agg_choice.lower()}** periods: "
-        f"{aligned_start.date()} → {aligned_end.date()}."
-    )
+approximate = progressive.toggle() #estimate the series first, see progressive.py
 
 #apply filters
-mask = (df["Order Date"] >= aligned_start) & (df["Order Date"] <= aligned_end)
-
-if segments:
-    mask &= df["Segment"].isin(selected_segments)
-if regions:
-    mask &= df["Region"].isin(selected_regions)
-if categories:
-    mask &= df["Category"].isin(selected_categories)
+mask = filter_mask(
+    df,
+    segments=selected_segments if segments else None, #only filter on columns that exist
+    regions=selected_regions if regions else None,
+    categories=selected_categories if categories else None,
+    start=aligned_start,
+    end=aligned_end,
+)
 
 filtered = df[mask].copy()
 
@@ -139,58 +148,75 @@ if filtered.empty:
     st.stop()
 
 #create data frame
-filtered = filtered.set_index("Order Date")
-
-if show_by_category and "Category" in filtered.columns: #see if the data needs to be grouped by category for plotting
-    # Group by Category and resample
-    sales_over_time = (
-        filtered
-        .groupby("Category")["Sales"]
-        .resample(freq)
-        .sum()
-        .reset_index()
-    )
-
-    # Add a nice Period label
-    if agg_choice == "Daily":
-        sales_over_time["Period"] = sales_over_time["Order Date"]
-    else:
-        period = sales_over_time["Order Date"].dt.to_period(freq)
-        sales_over_time["Period"] = period.dt.to_timestamp()
-
-else: #if there isn't a desire to plot individual categories
-    # Aggregate across all categories (single line)
-    sales_over_time = (
-        filtered["Sales"]
-        .resample(freq)
-        .sum()
-        .to_frame(name="Sales")
-        .reset_index()
+by_category = show_by_category and "Category" in filtered.columns #see if the data needs to be grouped by category for plotting
+snap = load_kpi_snapshot()
+standard = freq == "M" and not by_category and is_standard( #the snapshot holds the default monthly series
+    snap,
+    segments=selected_segments if segments else None,
+    regions=selected_regions if regions else None,
+    categories=selected_categories if categories else None,
+    start=aligned_start,
+    end=aligned_end,
+)
+estimated = False #True while the page shows sample estimates in approximate-first mode
+if standard:
+    sales_over_time = snap["tables"]["monthly_sales"]
+elif approximate:
+    filters = dict(
+        segments=selected_segments if segments else None,
+        regions=selected_regions if regions else None,
+        categories=selected_categories if categories else None,
+        start=aligned_start,
+        end=aligned_end,
     )
-
-    if agg_choice == "Daily":
-        sales_over_time["Period"] = sales_over_time["Order Date"]
-    else:
-        period = sales_over_time["Order Date"].dt.to_period(freq)
-        sales_over_time["Period"] = period.dt.to_timestamp()
-    # Add a dummy Category column so plotting code can stay simple
-    sales_over_time["Category"] = "All Categories"
+    params = (freq, by_category, repr(filters))
+    sales_over_time = progressive.exact("sales_over_time", sales_over_time_for, filtered, freq, by_category, params=params)
+    if sales_over_time is None:
+        sample, lines = progressive.sample_lines(**filters)
+        sales_over_time = estimated_sales_over_time(sample, lines, freq, by_category=by_category)
+        total_estimate = sample.totals(lines).iloc[0]
+        estimated = True
+else:
+    sales_over_time = sales_over_time_for(filtered, freq, by_category=by_category)
+
+#export the filtered rows or the aggregated series that is plotted (exact series only)
+export_button(
+    df,
+    mask,
+    name="sales_over_time",
+    tables={} if estimated else {f"{agg_choice} Sales": sales_over_time},
+    full_rows=full_rows(df, aligned_start, aligned_end), #every column of the filtered rows
+)
 
 #KPIs
 st.subheader("Summary")
+if estimated:
+    progressive.refining("sales_over_time", params)
 
-total_sales = sales_over_time["Sales"].sum()
+total_sales = total_estimate["estimate"] if estimated else sales_over_time["Sales"].sum()
 n_periods = sales_over_time["Period"].nunique()
 avg_per_period = total_sales / n_periods if n_periods > 0 else 0
 
 col1, col2, col3 = st.columns(3)
-col1.metric("Total Sales", f"${total_sales:,.2f}")
-col2.metric(f"Avg {agg_choice} Sales", f"${avg_per_period:,.2f}")
+col1.metric(
+    "Total Sales",
+    f"{'≈' if estimated else ''}${total_sales:,.2f}",
+    help=f"95% interval: ${total_estimate['low']:,.2f} – ${total_estimate['high']:,.2f}" if estimated else None,
+)
+col2.metric(f"Avg {agg_choice} Sales", f"{'≈' if estimated else ''}${avg_per_period:,.2f}")
 col3.metric("Number of Periods", f"{n_periods:,}")
 
 #plot
+import plotly.express as px #deferred until a chart is actually drawn
+
 st.subheader(f"Sales Over Time ({agg_choice})")
 
+error_bars = {} #95% intervals on the estimated points
+if estimated:
+    sales_over_time["Interval"] = sales_over_time["High"] - sales_over_time["Sales"]
+    sales_over_time["Interval_Minus"] = sales_over_time["Sales"] - sales_over_time["Low"]
+    error_bars = {"error_y": "Interval", "error_y_minus": "Interval_Minus"}
+
 if show_by_category and "Category" in filtered.columns: #if plotting individual category lines, need to color them differently
     fig = px.line(
         sales_over_time,
@@ -203,7 +229,9 @@ if show_by_category and "Category" in filtered.columns: #if plotting individual
             "Sales": "Sales ($)",
             "Category": "Category"
         },
-        title=f"Sales Over Time by Category ({agg_choice} Aggregation)"
+        title=f"Sales Over Time by Category ({agg_choice} Aggregation)",
+        render_mode=render_mode(len(sales_over_time)), #daily periods over years are drawn with WebGL
+        **error_bars,
     )
 else:
     fig = px.line(
@@ -215,13 +243,15 @@ else:
             "Period": "Date",
             "Sales": "Sales ($)"
         },
-        title=f"Total Sales Over Time ({agg_choice} Aggregation)"
+        title=f"Total Sales Over Time ({agg_choice} Aggregation)",
+        render_mode=render_mode(len(sales_over_time)),
+        **error_bars,
     )
 
 fig.update_xaxes(showgrid=False)
 fig.update_yaxes(tickprefix="$", showgrid=True)
 
-st.plotly_chart(fig, use_container_width=True)
+st.plotly_chart(compact(fig), use_container_width=True)
 
 #Show raw data so that the user has somethign to drill down to specific order numbers to root cause
 with st.expander("Show aggregated data table"):
@@ -230,9 +260,10 @@ with st.expander("Show aggregated data table"):
         show_cols.insert(1, "Category")
     
 
-    sales_over_time["Period"] = sales_over_time["Period"].dt.date
+    #a new frame, sales_over_time itself is what the deferred export serializes
     styled_table = (
     sales_over_time[show_cols]
+    .assign(Period=sales_over_time["Period"].dt.date)
     .reset_index(drop=True)
     .style.format({"Sales": "${:,.2f}"})
     .set_properties(subset=["Sales"], **{"text-align": "right"})
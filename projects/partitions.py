@@ -0,0 +1,83 @@
+#year / month partitioned datasets: a directory of files named by the period they hold,
+#e.g. Data/partitions/2017.csv or Data/partitions/2017-03.parquet (a prefix such as
+#train_2017-03.csv is fine too). split an existing train.csv with:
+#   python projects/partitions.py Data/train.csv Data/partitions --by month --format parquet
+import argparse
+import os
+import re
+
+import pandas as pd
+
+PARTITION_FORMATS = {".csv": "csv", ".parquet": "parquet"}
+_PERIOD_RE = re.compile(r"(\d{4})(?:-(\d{2}))?$")
+
+CSV_DATE_FORMAT = "%d/%m/%Y" #same layout as the original train.csv
+
+
+def list_partitions(directory):
+    #[(path, first day, last day)] for every partition file in directory, oldest first
+    partitions = []
+    for name in os.listdir(directory):
+        stem, ext = os.path.splitext(name)
+        match = _PERIOD_RE.search(stem)
+        if ext.lower() not in PARTITION_FORMATS or not match:
+            continue
+
+        year, month = match.groups()
+        period = pd.Period(f"{year}-{month}" if month else year, freq="M" if month else "Y")
+        partitions.append((os.path.join(directory, name), period.start_time, period.end_time.normalize()))
+
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def data_files(path):
+    #the files that make up the dataset at path (one csv, or every partition)
+    if os.path.isdir(path):
+        return [p for p, _, _ in list_partitions(path)]
+    return [path]
+
+
+def prune(partitions, start=None, end=None):
+    #only the partitions whose period overlaps [start, end]
+    start = pd.to_datetime(start) if start is not None else None
+    end = pd.to_datetime(end) if end is not None else None
+    return [
+        p for p in partitions
+        if (start is None or p[2] >= start) and (end is None or p[1] <= end)
+    ]
+
+
+def write_partitions(df, out_dir, by="month", fmt="csv"):
+    #split df on Order Date into one file per year or month
+    os.makedirs(out_dir, exist_ok=True)
+    freq = "M" if by == "month" else "Y"
+    written = []
+
+    for period, part in df.groupby(df["Order Date"].dt.to_period(freq)):
+        path = os.path.join(out_dir, f"{period}.{fmt}")
+        if fmt == "parquet":
+            part.to_parquet(path, index=False)
+        else:
+            part.to_csv(path, index=False, date_format=CSV_DATE_FORMAT)
+        written.append(path)
+
+    return written
+
+
+def main(argv=None):
+    from dataset import DAY_COLUMNS, read_data
+
+    parser = argparse.ArgumentParser(description="Split a dataset into year or month partitions.")
+    parser.add_argument("source", help="train.csv (or an existing partition directory)")
+    parser.add_argument("out_dir", help="directory to write the partitions to")
+    parser.add_argument("--by", choices=["year", "month"], default="month")
+    parser.add_argument("--format", choices=sorted(PARTITION_FORMATS.values()), default="csv")
+    args = parser.parse_args(argv)
+
+    df = read_data(args.source).drop(columns=list(DAY_COLUMNS.values())) #recomputed on read
+    written = write_partitions(df, args.out_dir, by=args.by, fmt=args.format)
+    print(f"wrote {len(written)} partitions to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#size of what the pages send to the browser for their charts. compact() trims a plotly figure
+#before st.plotly_chart: plotly encodes numpy number arrays as base64 typed arrays, but dates
+#go out as one ISO string per point, so date arrays become epoch milliseconds on a date axis,
+#and big scatter traces are drawn with WebGL. the command line part measures the chart
+#payload of every page per rerun, run from the repo root:
+#   python projects/payload.py --rounds 5 --budget-kb 150
+#it exits non-zero when a rerun of any page sends more than the budget, so a chart that
+#starts shipping raw rows again shows up.
+import argparse
+import glob
+import os
+import random
+import sys
+
+import numpy as np
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+WEBGL_MIN_POINTS = 1000 #scatter / line traces with more points than this are drawn with WebGL
+
+
+def render_mode(n_points):
+    #render_mode for px.line / px.scatter
+    return "webgl" if n_points > WEBGL_MIN_POINTS else "svg"
+
+
+def compact(fig):
+    #in place, returns fig: date x / y arrays -> epoch ms floats (sent as typed arrays) on a
+    #date axis, number lists -> numpy arrays (also typed arrays)
+    for trace in fig.data:
+        for axis in ("x", "y"):
+            values = trace[axis] if axis in trace else None
+            if values is None or isinstance(values, str):
+                continue
+            arr = np.asarray(values)
+            if np.issubdtype(arr.dtype, np.datetime64):
+                trace[axis] = arr.astype("datetime64[ms]").astype(np.int64).astype(np.float64)
+                anchor = trace[f"{axis}axis"] if f"{axis}axis" in trace else None
+                fig.layout[f"{axis}axis{(anchor or axis)[1:]}"].type = "date"
+            elif arr.dtype == object and len(arr) and all(isinstance(v, (int, float)) for v in arr):
+                trace[axis] = arr.astype(np.float64)
+    return fig
+
+
+def chart_bytes(at):
+    #bytes of each plotly chart spec an AppTest run sent
+    return [len(element.proto.spec) for element in at.get("plotly_chart")]
+
+
+def measure(path, rounds, seed=0):
+    #chart payload of the first run of a page and of rounds reruns after random filter changes
+    from streamlit.testing.v1 import AppTest
+    from load_test import random_change
+
+    rng = random.Random(seed)
+    at = AppTest.from_file(path, default_timeout=120).run()
+    runs = [chart_bytes(at)]
+    for _ in range(rounds):
+        random_change(at, rng)
+        at.run()
+        runs.append(chart_bytes(at))
+    totals = [sum(r) for r in runs]
+    return {
+        "charts": len(runs[0]),
+        "first_kb": totals[0] / 1024,
+        "mean_kb": float(np.mean(totals)) / 1024,
+        "max_kb": max(totals) / 1024,
+        "largest_chart_kb": max((max(r) for r in runs if r), default=0) / 1024,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the chart payload each page sends per rerun.")
+    parser.add_argument("--rounds", type=int, default=5, help="random filter changes per page")
+    parser.add_argument("--pages", nargs="*", help="page files to measure (default: every page)")
+    parser.add_argument("--budget-kb", type=float, help="fail if any rerun sends more than this")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, PROJECT_DIR) #the pages import loader etc. as top level modules
+    from streamlit import logger
+
+    logger.set_log_level("error")
+    pages = args.pages or sorted(glob.glob(os.path.join(PROJECT_DIR, "pages", "*.py")))
+    over = []
+    print(f"{'page':34s} {'charts':>6s} {'first KB':>9s} {'mean KB':>8s} {'max KB':>8s} {'largest KB':>10s}")
+    for page in pages:
+        r = measure(os.path.abspath(page), args.rounds, args.seed)
+        name = os.path.relpath(os.path.abspath(page), PROJECT_DIR)
+        print(
+            f"{name:34s} {r['charts']:6d} {r['first_kb']:9.1f} {r['mean_kb']:8.1f}"
+            f" {r['max_kb']:8.1f} {r['largest_chart_kb']:10.1f}"
+        )
+        if args.budget_kb is not None and r["max_kb"] > args.budget_kb:
+            over.append(name)
+
+    if over:
+        print(f"over the {args.budget_kb:g} KB budget: {', '.join(over)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
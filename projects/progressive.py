@@ -0,0 +1,92 @@
+#approximate-first mode for the sales, map and sales over time pages. when a user switches
+#it on, a page asks exact() for its result; anything that isn't back within
+#FIRST_PAINT_SECONDS keeps computing on a background worker while the page draws estimates
+#from the stratified sample (sampling.py) with a "refining…" badge, and a polling fragment
+#reruns the page once the exact result is in. finished results are kept per data version
+#and filter, so going back to an earlier selection is exact straight away.
+import copy
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import streamlit as st
+
+from loader import current_dataset, data_version, load_sample
+from metrics import filter_mask
+
+FIRST_PAINT_SECONDS = 0.2 #how long a page waits for the exact result before showing estimates
+POLL_SECONDS = 0.5
+MAX_RESULTS = 64 #exact results kept across all sessions, jobs still running are never dropped
+
+
+class _Jobs:
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="exact-result")
+        self.futures = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, key, fn, args):
+        with self.lock:
+            future = self.futures.get(key)
+            if future is None:
+                future = self.futures[key] = self.executor.submit(fn, *args)
+            self.futures.move_to_end(key)
+            done = [k for k, f in self.futures.items() if f.done()] #oldest first, pending jobs always stay
+            for old in done[:max(len(self.futures) - MAX_RESULTS, 0)]:
+                del self.futures[old]
+            return future
+
+    def get(self, key):
+        with self.lock:
+            return self.futures.get(key)
+
+
+@st.cache_resource
+def _jobs():
+    return _Jobs()
+
+
+def toggle():
+    #sidebar switch for the mode, off unless the user opts in
+    return st.sidebar.toggle(
+        "Approximate first",
+        value=False,
+        key="approximate_first",
+        help="Show estimates from a sample of orders straight away and replace them with the "
+             "exact numbers when they are ready. Worth it for wide filters over long histories.",
+    )
+
+
+def _key(name, params):
+    return (current_dataset(), data_version(), name, params)
+
+
+def exact(name, fn, *args, params=()):
+    #fn(*args) if it is (or already was) done within FIRST_PAINT_SECONDS, otherwise None and
+    #it carries on in the background. params has to identify args, e.g. the page's filters.
+    #the result is shared between sessions, so each caller gets its own copy
+    future = _jobs().submit(_key(name, params), fn, args)
+    try:
+        return copy.deepcopy(future.result(timeout=FIRST_PAINT_SECONDS))
+    except FutureTimeout:
+        return None
+
+
+def sample_lines(**filters):
+    #(sample, its lines that pass filters), filters as for metrics.filter_mask
+    sample = load_sample()
+    return sample, sample.lines[filter_mask(sample.lines, **filters)]
+
+
+def refining(name, params=()):
+    #badge for a page showing estimates; reruns the page when exact(name) has finished
+    st.badge(f"Estimated from a {load_sample().fraction:.0%} sample of orders, refining…",
+             icon=":material/hourglass_top:", color="orange")
+    _rerun_when_done(_key(name, params))
+
+
+@st.fragment(run_every=POLL_SECONDS)
+def _rerun_when_done(key):
+    future = _jobs().get(key)
+    if future is None or future.done(): #None: dropped or the data changed, rerun either way
+        st.rerun(scope="app")
@@ -0,0 +1,277 @@
+#registry of the datasets one server serves (e.g. one train.csv-shaped file per business
+#unit) under a process-wide memory budget. each dataset's columns and everything derived
+#from them (date index, star schema, sample) live in one entry per data version; when the
+#entries add up to more than the budget the least recently used ones are dropped.
+#columns are loaded one at a time, the first time anything asks for them. the first csv
+#parse of a dataset file writes a parquet snapshot under SNAPSHOT_DIR, named by the content
+#hash of the file, and every later column (after an eviction or a restart too) is read
+#from it on its own instead of parsing the csv again.
+#nothing in here imports streamlit, loader.py keeps one registry per server process.
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from dataset import DATA_PATH, FRAME_FORMAT, REPO_ROOT, read_columns, read_data, read_partitions
+
+#"east=Data/east.csv;west=/srv/west" (a path may be a partition directory), relative paths
+#are taken from the repo root. just DATA_PATH when unset
+DATASETS_SPEC = os.environ.get("DASHBOARD_DATASETS", "")
+MEMORY_BUDGET_MB = float(os.environ.get("DASHBOARD_MEMORY_MB", 2048))
+SNAPSHOT_DIR = os.environ.get("DASHBOARD_SNAPSHOTS", os.path.join(REPO_ROOT, ".cache", "datasets"))
+
+
+def dataset_name(path):
+    #Data/train.csv -> train
+    return os.path.splitext(os.path.basename(path.rstrip("/\\")))[0]
+
+
+def configured_datasets(spec=DATASETS_SPEC):
+    #{name: path} in the order given
+    if not spec.strip():
+        return {dataset_name(DATA_PATH): DATA_PATH}
+    datasets = {}
+    for item in spec.split(";"):
+        if not item.strip():
+            continue
+        name, sep, path = item.partition("=")
+        if not sep:
+            raise ValueError(f"DASHBOARD_DATASETS entry {item!r} is not name=path")
+        datasets[name.strip()] = os.path.join(REPO_ROOT, path.strip())
+    return datasets
+
+
+def nbytes(obj, seen=None):
+    #approximate memory held by obj: frames, arrays and the containers / attributes around
+    #them. seen holds ids already counted so shared objects are counted once
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        return int(obj.nbytes)
+    if isinstance(obj, dict):
+        return sum(nbytes(v, seen) for v in obj.values())
+    if isinstance(obj, (list, tuple, set)):
+        return sum(nbytes(v, seen) for v in obj)
+    if hasattr(obj, "__dict__"):
+        return nbytes(vars(obj), seen)
+    return 0
+
+
+class _Entry:
+    #one data version of one dataset
+    def __init__(self, name, version):
+        self.name = name
+        self.version = version
+        self.items = {} #key -> object, see _column_key for the columns
+        self.sizes = {} #key -> bytes
+        self.columns = {} #partition files (None: the whole dataset) -> column names, in order
+        self.snapshot = None #parquet snapshot the columns of this version are read from
+        self.lock = threading.RLock() #builds of this entry, nested builds reuse its columns
+        self._seen = set()
+
+    @property
+    def nbytes(self):
+        return sum(self.sizes.values())
+
+
+class _Stats:
+    def __init__(self, path):
+        self.path = path
+        self.loads = 0 #column reads, from the data files or the snapshot
+        self.snapshot_loads = 0
+        self.load_seconds = None #last column read
+        self.build_seconds = 0.0 #derived items of the loaded versions
+        self.evictions = 0
+        self.last_used = None
+
+
+class DatasetRegistry:
+    def __init__(self, datasets, budget_bytes, snapshot_dir=SNAPSHOT_DIR):
+        self.paths = dict(datasets)
+        self.budget_bytes = budget_bytes
+        self.snapshot_dir = snapshot_dir
+        self._entries = OrderedDict() #(name, version) -> _Entry, least recently used first
+        self._stats = {name: _Stats(path) for name, path in self.paths.items()}
+        self._lock = threading.Lock() #the dict and stats only, never held while building
+
+    def names(self):
+        return list(self.paths)
+
+    def path(self, name):
+        if name not in self.paths:
+            raise KeyError(f"unknown dataset {name!r}, expected one of {self.names()}")
+        return self.paths[name]
+
+    def frame(self, name, version, columns=None, paths=None, rows=None, keep=True):
+        #the dataset, or just the partition files in paths, with only columns (all of them
+        #when None, names it doesn't have are skipped) and only the row positions in rows
+        #(all of them when None). columns are shared between callers but the frame is new
+        #every call, so callers may change it. keep=False uses the columns already loaded
+        #but doesn't hold on to the ones it reads, for builds of derived items that only
+        #need the wide columns once
+        entry = self._entry(name, version)
+        with entry.lock:
+            if paths not in entry.columns:
+                entry.columns[paths] = read_columns(self.path(name))
+            wanted = entry.columns[paths] if columns is None else [c for c in entry.columns[paths] if c in set(columns)]
+            missing = [c for c in wanted if _column_key(paths, c) not in entry.items]
+            read = self._read_columns(entry, paths, missing, keep) if missing else {}
+            series = {c: entry.items[_column_key(paths, c)] if c not in read else read[c] for c in wanted}
+        self._enforce_budget(keep=(name, version))
+        if rows is not None:
+            series = {c: s.take(rows) for c, s in series.items()} #copies of just those rows
+        return pd.DataFrame(series) #copies, the shared columns are never handed out
+
+    def get(self, name, version, key, build):
+        #the object cached under key for this dataset version, build(entry) makes it
+        entry = self._entry(name, version)
+        with entry.lock:
+            if key not in entry.items:
+                started = time.perf_counter()
+                obj = build(entry)
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    entry.items[key] = obj
+                    entry.sizes[key] = nbytes(obj, entry._seen)
+                    self._stats[name].build_seconds += elapsed
+            obj = entry.items[key]
+        self._enforce_budget(keep=(name, version))
+        return obj
+
+    def evict(self, name):
+        #drop every loaded version of name now
+        with self._lock:
+            evicted = [self._entries.pop(k) for k in list(self._entries) if k[0] == name]
+            self._stats[name].evictions += bool(evicted)
+
+    def used_bytes(self):
+        with self._lock:
+            return sum(e.nbytes for e in self._entries.values())
+
+    def stats(self):
+        #one row per configured dataset
+        with self._lock:
+            loaded = {}
+            for entry in self._entries.values():
+                loaded.setdefault(entry.name, []).append(entry)
+            rows = []
+            for name, stats in self._stats.items():
+                entries = loaded.get(name, [])
+                rows.append({
+                    "Dataset": name,
+                    "Loaded": bool(entries),
+                    "Versions": ", ".join(str(e.version) for e in entries),
+                    "Memory (MB)": sum(e.nbytes for e in entries) / 2 ** 20,
+                    "Items": ", ".join(sorted({str(k if isinstance(k, str) else k[0]) for e in entries for k in e.items})),
+                    "Loads": stats.loads,
+                    "From snapshot": stats.snapshot_loads,
+                    "Last load (s)": stats.load_seconds,
+                    "Derived builds (s)": stats.build_seconds,
+                    "Evictions": stats.evictions,
+                    "Last used": pd.Timestamp(stats.last_used, unit="s") if stats.last_used else pd.NaT,
+                    "Path": stats.path,
+                })
+        return pd.DataFrame(rows)
+
+    def _entry(self, name, version):
+        path = self.path(name)
+        with self._lock:
+            key = (name, version)
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry(name, version)
+                for old in [k for k in self._entries if k[0] == name and k[1] < version - 1]:
+                    del self._entries[old] #superseded, keep the current and previous version
+            self._entries.move_to_end(key)
+            self._stats[name].last_used = time.time()
+            return entry
+
+    def _enforce_budget(self, keep):
+        #pop least recently used entries until under budget. keep (the entry just used)
+        #stays even if it is over the budget on its own
+        with self._lock:
+            used = sum(e.nbytes for e in self._entries.values())
+            for key in list(self._entries):
+                if used <= self.budget_bytes:
+                    break
+                if key == keep:
+                    continue
+                entry = self._entries.pop(key)
+                used -= entry.nbytes
+                self._stats[entry.name].evictions += 1
+
+    def _snapshot_file(self, name, content_hash):
+        return os.path.join(self.snapshot_dir, f"{name}-{content_hash}.parquet")
+
+    def _read_columns(self, entry, paths, columns, keep=True):
+        #read columns, into entry when keep (called with entry.lock held). returns the frame read
+        path = self.path(entry.name)
+        started = time.perf_counter()
+        from_snapshot = False
+        if paths is not None: #partition files are read with just these columns, no snapshot
+            df = read_partitions(paths, columns) if paths else read_data(path, start=pd.Timestamp.max, columns=columns)
+        elif os.path.isdir(path):
+            df = read_data(path, columns=columns)
+        else:
+            df, from_snapshot = self._read_snapshot(entry, path, columns)
+
+        with self._lock:
+            for col in df.columns if keep else []:
+                key = _column_key(paths, col)
+                if key not in entry.items:
+                    entry.items[key] = df[col]
+                    entry.sizes[key] = nbytes(df[col], entry._seen)
+            stats = self._stats[entry.name]
+            stats.loads += 1
+            stats.snapshot_loads += from_snapshot
+            stats.load_seconds = time.perf_counter() - started
+        return df
+
+    def _read_snapshot(self, entry, path, columns):
+        #(frame with at least columns, read from the snapshot?) for a single file dataset
+        from snapshot import dataset_version #content hash of the file, not the watcher's counter
+        if entry.snapshot is None:
+            content_hash = f"{dataset_version(path)}v{FRAME_FORMAT}" #a new frame layout never reads old snapshots
+            snap_file = self._snapshot_file(entry.name, content_hash)
+            if os.path.exists(snap_file):
+                entry.snapshot = snap_file
+            else:
+                df = read_data(path)
+                if f"{dataset_version(path)}v{FRAME_FORMAT}" != content_hash:
+                    return df, False #changed while it was read: keep every column, no snapshot to come back to
+                self._write_snapshot(entry.name, snap_file, df)
+                entry.snapshot = snap_file
+                return df[columns], False
+        return pd.read_parquet(entry.snapshot, columns=columns), True
+
+    def _write_snapshot(self, name, target, df):
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.snapshot_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            df.to_parquet(tmp, index=False)
+            os.replace(tmp, target) #readers never see a half written file
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        with self._lock: #a loaded older version may still read columns from its snapshot
+            in_use = {e.snapshot for e in self._entries.values()} | {target}
+        for old in os.listdir(self.snapshot_dir): #older content of the same dataset
+            old_path = os.path.join(self.snapshot_dir, old)
+            if old.endswith((".parquet", ".pkl")) and old.rsplit("-", 1)[0] == name and old_path not in in_use:
+                os.unlink(old_path)
+
+
+def _column_key(paths, column):
+    #entry item holding one column of the whole dataset or of a set of partition files
+    return ("column", column) if paths is None else ("partitions", paths, column)
@@ -0,0 +1,130 @@
+#stratified order sample for approximate answers over big selections. whole orders are
+#sampled (so order counts stay estimable) within Segment x Region x order year strata, and
+#every total comes back with a 95% confidence interval from the usual stratified estimator:
+#   total = sum_h N_h / n_h * sum(y),  var = sum_h N_h^2 (1 - n_h / N_h) s_h^2 / n_h
+#filters are applied to the sample's lines like any other frame; orders that drop out of the
+#filter count as zeros in their stratum, which is what keeps the intervals honest.
+#nothing in here touches streamlit, see progressive.py for the page side.
+import numpy as np
+import pandas as pd
+
+from metrics import CONTIGUOUS_STATES, STATE_TO_ABBREV
+
+STRATA = ["Segment", "Region"] #plus the order year
+Z_95 = 1.959964
+
+
+class StratifiedSample:
+    def __init__(self, df, fraction=0.02, min_orders=30, seed=0):
+        #at least min_orders per stratum (or all of it) so each stratum has a variance
+        orders = df.drop_duplicates("Order ID")
+        strata = STRATA + [orders["Order Date"].dt.year.rename("Order Year")]
+        stratum = orders.groupby(strata, observed=True, sort=False).ngroup().to_numpy()
+
+        population = np.bincount(stratum)
+        sampled = np.minimum(np.maximum(np.ceil(population * fraction), min_orders), population).astype(int)
+
+        #random order within each stratum, keep the first n_h
+        rng = np.random.default_rng(seed)
+        shuffled = np.lexsort((rng.random(len(stratum)), stratum))
+        position = np.empty(len(stratum), dtype=int)
+        position[shuffled] = np.arange(len(stratum)) - np.repeat(np.cumsum(population) - population, population)
+        keep = position < sampled[stratum]
+
+        stratum_of = pd.Series(stratum[keep], index=orders["Order ID"].to_numpy()[keep])
+        lines = df[df["Order ID"].isin(stratum_of.index)]
+        self.lines = lines.assign(_stratum=stratum_of.reindex(lines["Order ID"].to_numpy()).to_numpy())
+        self.population = population
+        self.sampled = sampled
+        self.fraction = len(stratum_of) / max(len(orders), 1)
+
+    def _estimate(self, y, by):
+        #y: one value per (stratum, order, *by) -> DataFrame of estimate / stderr per by group
+        sums = pd.DataFrame({"s1": y, "s2": y ** 2}).groupby(level=["_stratum"] + by, observed=True).sum()
+        h = sums.index.get_level_values("_stratum").to_numpy()
+        big_n, n = self.population[h], self.sampled[h]
+
+        weight = big_n / n
+        s1, s2 = sums["s1"].to_numpy(), sums["s2"].to_numpy()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            var_h = np.where(n > 1, (s2 - s1 ** 2 / n) / (n - 1), 0.0) #s_h^2 with the zeros included
+        parts = pd.DataFrame(
+            {"estimate": weight * s1, "variance": big_n ** 2 * (1 - n / big_n) * var_h / n},
+            index=sums.index,
+        )
+        if by:
+            parts = parts.groupby(level=by, observed=True).sum()
+        else:
+            parts = parts.sum().to_frame().T
+        return parts.assign(stderr=np.sqrt(parts.pop("variance").clip(lower=0)))
+
+    def totals(self, filtered, by=(), column="Sales"):
+        #estimated sum of column over the filtered lines, per by group
+        by = list(by)
+        y = filtered[column].groupby(_keys(filtered, by), observed=True).sum()
+        return _interval(self._estimate(y, by))
+
+    def orders(self, filtered, by=()):
+        #estimated number of distinct orders with a line in the filter, per by group
+        by = list(by)
+        y = filtered["Order ID"].groupby(_keys(filtered, by), observed=True).size().clip(upper=1).astype(float)
+        return _interval(self._estimate(y, by))
+
+    def per_order(self, filtered, by=(), column="Sales"):
+        #estimated column total / order count per by group (e.g. average order value), the
+        #interval from the linearised ratio z = y - R * x
+        by = list(by)
+        grouped = filtered[column].groupby(_keys(filtered, by), observed=True)
+        y, x = grouped.sum(), grouped.size().clip(upper=1).astype(float)
+
+        total_y, total_x = self._estimate(y, by)["estimate"], self._estimate(x, by)["estimate"]
+        ratio = total_y / total_x.replace(0, np.nan)
+        r = ratio.reindex(y.index.droplevel([0, 1])).to_numpy() if by else ratio.iloc[0]
+        z = self._estimate(y - r * x, by)
+        return _interval(pd.DataFrame(
+            {"estimate": ratio, "stderr": z["stderr"] / total_x.replace(0, np.nan)},
+            index=total_y.index,
+        ))
+
+
+def estimated_state_summary(sample, lines):
+    #metrics.state_summary from the sample: Total_Sales / Num_Sales / Avg_Sale estimates, each
+    #with _Low / _High columns. Num_Customers is left empty, distinct counts don't scale up
+    parts = {
+        "Total_Sales": sample.totals(lines, ["State"]),
+        "Num_Sales": sample.orders(lines, ["State"]),
+        "Avg_Sale": sample.per_order(lines, ["State"]),
+    }
+    state_agg = pd.DataFrame(index=parts["Total_Sales"].index)
+    for name, est in parts.items():
+        state_agg[name] = est["estimate"]
+        state_agg[f"{name}_Low"] = est["low"].clip(lower=0)
+        state_agg[f"{name}_High"] = est["high"]
+    state_agg["Num_Customers"] = np.nan
+    state_agg = state_agg.reset_index()
+
+    state_agg["state_abbrev"] = state_agg["State"].map(STATE_TO_ABBREV)
+    return state_agg[state_agg["state_abbrev"].isin(CONTIGUOUS_STATES)].copy()
+
+
+def estimated_sales_over_time(sample, lines, freq, by_category=False):
+    #metrics.sales_over_time from the sample, with Low / High columns. periods no sampled
+    #order falls in are missing rather than zero
+    dates = lines["Order Date"]
+    period = dates.dt.normalize() if freq == "D" else dates.dt.to_period(freq).dt.to_timestamp()
+    lines = lines.assign(Period=period)
+
+    est = sample.totals(lines, ["Category", "Period"] if by_category else ["Period"]).reset_index()
+    if not by_category:
+        est["Category"] = "All Categories"
+    return est.rename(columns={"estimate": "Sales", "low": "Low", "high": "High"}).assign(
+        Low=lambda t: t["Low"].clip(lower=0)
+    )
+
+
+def _keys(filtered, by):
+    return [filtered["_stratum"], filtered["Order ID"]] + [filtered[b] for b in by]
+
+
+def _interval(est):
+    return est.assign(low=est["estimate"] - Z_95 * est["stderr"], high=est["estimate"] + Z_95 * est["stderr"])
@@ -0,0 +1,53 @@
+#progressive rendering for pages with several independent sections. the page reserves a
+#placeholder per section in layout order, hands the section's work to a shared thread pool,
+#draws its cheap parts (KPIs) straight away and then calls render(), which fills the
+#placeholders in whatever order the work finishes. compute functions run off the script
+#thread, so they must be plain pandas / plotly work (no st.* calls); draw functions run on
+#the script thread inside the section's placeholder.
+#if the user changes a filter meanwhile, streamlit ends the run at the next element update
+#(render() updates a status line while it waits so that happens promptly) and the sections
+#that haven't started yet are cancelled. ones already running finish and are dropped.
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import streamlit as st
+
+POOL_WORKERS = 4 #shared by every session of the server
+POLL_SECONDS = 0.1
+
+
+@st.cache_resource
+def _pool():
+    return ThreadPoolExecutor(max_workers=POOL_WORKERS, thread_name_prefix="page-section")
+
+
+class Sections:
+    def __init__(self):
+        self._sections = [] #(placeholder, future, draw)
+
+    def add(self, placeholder, compute, draw, *args, label="section"):
+        #compute(*args) on the pool, then draw(result) in placeholder (an st.empty()).
+        #returns the future, e.g. for results the page needs again after render()
+        placeholder.caption(f":material/hourglass_top: Loading {label}…")
+        future = _pool().submit(compute, *args)
+        self._sections.append((placeholder, future, draw))
+        return future
+
+    def render(self):
+        #draw every section as its work completes, returns once all are drawn
+        pending = {future: (placeholder, draw) for placeholder, future, draw in self._sections}
+        total = len(pending)
+        status = st.empty()
+        try:
+            while pending:
+                done, _ = wait(pending, timeout=POLL_SECONDS, return_when=FIRST_COMPLETED)
+                for future in done:
+                    placeholder, draw = pending.pop(future)
+                    with placeholder.container():
+                        draw(future.result())
+                if pending: #any element update lets streamlit stop a run the user has moved on from
+                    status.caption(f"{total - len(pending)} of {total} sections ready")
+            status.empty()
+        finally: #a rerun / stop (or an error in a section) leaves the rest to be cancelled
+            for future in pending:
+                future.cancel()
+            self._sections = []
@@ -0,0 +1,344 @@
+#sharded group-by for big frames on a process pool. the rows are split into shards by a hash
+#of SHARD_KEYS (Customer ID, or Order ID when a frame doesn't have it), the group codes and
+#value columns are written once into a shared memory block in shard order, and each worker
+#aggregates its own slice of that block with numpy and sends back one small partial per
+#shard. the partials are then merged in the parent.
+#distinct counts only merge by adding when no value is in two shards: a Customer ID shard
+#holds every line of its customers and so every line of their orders (an order has one
+#customer), a column that is its own shard key trivially so. anything else runs on pandas.
+#sums aren't sharded: adding per-shard float totals doesn't give pandas' compensated single
+#pass sum bit for bit, so metrics.group_agg computes them on pandas and joins them to the
+#sharded part. counts, distinct counts, min and max come out exactly the same.
+#off by default (WORKERS=1): set DASHBOARD_WORKERS above 1 on a host with the cores for it and
+#metrics.group_agg sends frames of at least MIN_ROWS here. scaling benchmark of the page
+#group-bys (sums included), run from the repo root:
+#   python projects/sharded.py --copies 50 --workers 1 2 4 8
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+WORKERS = int(os.environ.get("DASHBOARD_WORKERS", 1)) #opt in, one worker never shards
+MIN_ROWS = int(os.environ.get("DASHBOARD_SHARD_MIN_ROWS", 500_000)) #smaller frames stay on pandas
+SHARD_KEYS = ("Customer ID", "Order ID") #first one the aggregation merges under is used
+DISTINCT_WITHIN = { #shard key -> columns whose values never appear in two shards
+    "Customer ID": ("Customer ID", "Order ID"),
+    "Order ID": ("Order ID",),
+}
+FUNCS = ("size", "nunique", "min", "max")
+DENSE_KEYS = 4 #key spaces up to this many times the rows are counted with a lookup table, not hashed
+
+
+def _codes(values):
+    #(int64 codes in sorted value order with -1 for missing, the values as an index)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy().astype(np.int64), values.cat.categories
+    codes, uniques = pd.factorize(values, sort=True)
+    return codes.astype(np.int64), pd.Index(uniques)
+
+
+def _numbers(values):
+    #(numeric array, valid mask) for min / max, None if the dtype isn't supported
+    kind = values.dtype.kind
+    if kind == "M":
+        return values.to_numpy().view(np.int64), values.notna().to_numpy()
+    if kind in "biu":
+        return values.to_numpy().astype(np.int64), np.ones(len(values), dtype=bool)
+    if kind == "f":
+        array = values.to_numpy(dtype=np.float64)
+        return array, ~np.isnan(array)
+    return None
+
+
+def _views(buf, layout):
+    return {name: np.ndarray(shape, dtype=dtype, buffer=buf, offset=offset) for name, dtype, shape, offset in layout}
+
+
+def _group_index(group, space):
+    #(sorted distinct group ids, position of each row's group in them)
+    if space <= DENSE_KEYS * len(group):
+        present = np.bincount(group, minlength=space) > 0
+        return np.flatnonzero(present), (np.cumsum(present) - 1)[group]
+    inverse, groups = pd.factorize(group, sort=True)
+    return groups, inverse
+
+
+def _distinct_counts(inverse, values, n, size):
+    #number of distinct values per group 0..n-1
+    keys = inverse * size + values
+    if n * size <= DENSE_KEYS * len(keys):
+        seen = np.zeros(n * size, dtype=bool)
+        seen[keys] = True
+        return seen.reshape(n, size).sum(axis=1)
+    return np.bincount(pd.unique(keys) // size, minlength=n)
+
+
+def _partial(arrays, specs, space, lo, hi):
+    #aggregate rows [lo, hi) of the block: (group ids present, one array per spec)
+    group = arrays["gid"][lo:hi]
+    keep = group >= 0 #rows with a missing group-by value drop out, like pandas
+    groups, inverse = _group_index(group[keep], space)
+    n = len(groups)
+    out = []
+    for i, (_, func, size) in enumerate(specs):
+        if func == "size":
+            out.append(np.bincount(inverse, minlength=n))
+            continue
+        values = arrays[f"v{i}"][lo:hi][keep]
+        if func == "nunique":
+            valid = values >= 0
+            out.append(_distinct_counts(inverse[valid], values[valid], n, size))
+            continue
+        valid = arrays[f"m{i}"][lo:hi][keep]
+        #min / max, with the number of valid values so an all-missing group stays missing
+        out.append((_extreme(func, inverse[valid], values[valid], n), np.bincount(inverse[valid], minlength=n)))
+    return groups, out
+
+
+def _extreme(func, inverse, values, n):
+    #min / max of values per group 0..n-1 (groups without values keep the ufunc's identity)
+    if values.dtype.kind == "f":
+        start = np.inf if func == "min" else -np.inf
+    else:
+        start = np.iinfo(values.dtype).max if func == "min" else np.iinfo(values.dtype).min
+    result = np.full(n, start, dtype=values.dtype)
+    (np.minimum if func == "min" else np.maximum).at(result, inverse, values)
+    return result
+
+
+def _shard_task(shm_name, layout, specs, space, lo, hi):
+    shm = shared_memory.SharedMemory(name=shm_name) #the parent owns it and unlinks it, workers only read
+    try:
+        arrays = _views(shm.buf, layout)
+        return _partial(arrays, specs, space, lo, hi) #new arrays, nothing points into the block
+    finally:
+        del arrays #close() fails while views of the block are alive
+        shm.close()
+
+
+def _merge(partials, specs, space):
+    #(group ids, one merged array per spec, valid counts per min / max spec)
+    groups, inverse = _group_index(np.concatenate([g for g, _ in partials]), space)
+    n = len(groups)
+    merged, counts = [], {}
+    for i, (_, func, _) in enumerate(specs):
+        parts = [p[i] for _, p in partials]
+        if func in ("min", "max"):
+            values = np.concatenate([v for v, _ in parts])
+            valid = np.concatenate([c for _, c in parts]) > 0 #partials of groups with no values don't count
+            merged.append(_extreme(func, inverse[valid], values[valid], n))
+            counts[i] = np.bincount(inverse[valid], minlength=n) > 0
+        else:
+            merged.append(np.bincount(inverse, weights=np.concatenate(parts), minlength=n))
+    return groups, merged, counts
+
+
+class ShardedExecutor:
+    def __init__(self, workers=WORKERS, min_rows=MIN_ROWS):
+        self.workers = max(int(workers), 1)
+        self.min_rows = min_rows
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def pool(self):
+        #forkserver children start clean, forking a server with live threads is not safe
+        with self._lock:
+            if self._pool is None:
+                methods = mp.get_all_start_methods()
+                context = mp.get_context("forkserver" if "forkserver" in methods else "spawn")
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=context)
+            return self._pool
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def shard_key(self, df, by, named):
+        #the first shard key every distinct count merges under, None when it has to run on pandas
+        for col, func in named.values():
+            if func not in FUNCS or (func in ("min", "max") and _numbers(df[col].iloc[:0]) is None):
+                return None
+        for key in SHARD_KEYS:
+            if key in df.columns and all(
+                func != "nunique" or col in DISTINCT_WITHIN[key] or key in by for col, func in named.values()
+            ):
+                return key
+        return None
+
+    def wanted(self, df, by, named):
+        #worth sharding: big enough, more than one worker and an aggregation that merges
+        return self.workers > 1 and len(df) >= self.min_rows and self.shard_key(df, by, named) is not None
+
+    def agg(self, df, by, **named):
+        #df.groupby(by, observed=True).agg(**named) for named = {name: (column, func)} with
+        #func in FUNCS, over self.workers shards (workers=1 runs the shard in this process)
+        by = [by] if isinstance(by, str) else list(by)
+        key = self.shard_key(df, by, named)
+        if key is None or not by:
+            raise ValueError(f"can't shard {named} by {list(SHARD_KEYS)}, use pandas")
+
+        levels = [_codes(df[col]) for col in by]
+        sizes = [max(len(uniques), 1) for _, uniques in levels]
+        codes = np.stack([c for c, _ in levels])
+        gid = np.ravel_multi_index(np.maximum(codes, 0), sizes)
+        gid[(codes < 0).any(axis=0)] = -1
+
+        arrays, specs = {"gid": gid}, []
+        for i, (name, (col, func)) in enumerate(named.items()):
+            size = 0
+            if func == "nunique":
+                arrays[f"v{i}"], uniques = _codes(df[col])
+                size = max(len(uniques), 1)
+            elif func != "size":
+                arrays[f"v{i}"], arrays[f"m{i}"] = _numbers(df[col])
+            specs.append((name, func, size))
+
+        shards = self.workers
+        shard = pd.util.hash_pandas_object(df[key], index=False).to_numpy() % np.uint64(shards)
+        order = np.argsort(shard, kind="stable")
+        bounds = np.searchsorted(shard[order], np.arange(shards + 1))
+
+        layout, offset = [], 0
+        for name, array in arrays.items():
+            layout.append((name, array.dtype.str, array.shape, offset))
+            offset += -(-array.nbytes // 8) * 8
+        shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        try:
+            views = _views(shm.buf, layout)
+            for name, array in arrays.items():
+                np.take(array, order, out=views[name])
+            space = int(np.prod(sizes))
+            tasks = [(shm.name, layout, specs, space, int(bounds[s]), int(bounds[s + 1])) for s in range(shards)]
+            if shards == 1:
+                partials = [_partial(views, specs, space, lo, hi) for *_, lo, hi in tasks]
+            else:
+                partials = list(self.pool().map(_shard_task, *zip(*tasks)))
+            del views
+        finally:
+            shm.close()
+            shm.unlink()
+
+        return self._frame(df, by, levels, sizes, named, specs, *_merge(partials, specs, space))
+
+    def _frame(self, df, by, levels, sizes, named, specs, groups, merged, valid):
+        #the merged partials shaped like the pandas result
+        columns = {}
+        for i, (name, (col, func)) in enumerate(named.items()):
+            values = merged[i]
+            if func in ("size", "nunique"):
+                values = values.astype(np.int64)
+            else:
+                dtype = df[col].dtype
+                if dtype.kind == "M":
+                    values = values.view(dtype)
+                    values[~valid[i]] = np.datetime64("NaT")
+                elif dtype.kind == "f" or not valid[i].all():
+                    values = values.astype(np.float64)
+                    values[~valid[i]] = np.nan
+                else:
+                    values = values.astype(dtype)
+            columns[name] = values
+
+        positions = np.unravel_index(groups, sizes)
+        arrays = []
+        for col, (codes, uniques), pos in zip(by, levels, positions):
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                arrays.append(pd.Categorical.from_codes(pos, dtype=df[col].dtype))
+            else:
+                arrays.append(uniques.take(pos))
+        if len(by) == 1:
+            index = pd.Index(arrays[0], name=by[0])
+        else:
+            index = pd.MultiIndex.from_arrays(arrays, names=by)
+        return pd.DataFrame(columns, index=index)
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    #one per process, shared by every session
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ShardedExecutor()
+        return _executor
+
+
+def _scaled(df, copies):
+    #copies of df with their own orders and customers, for the benchmark
+    frames = []
+    for i in range(copies):
+        part = df.copy()
+        for col in ["Order ID", "Customer ID"]:
+            part[col] = part[col].astype(str) + f"-{i}"
+        frames.append(part)
+    big = pd.concat(frames, ignore_index=True)
+    return big.astype({"Order ID": "category", "Customer ID": "category"})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the page aggregations on pandas and on 1..N shard workers.")
+    parser.add_argument("--data", help="path to train.csv (default: the dashboard's dataset)")
+    parser.add_argument("--copies", type=int, default=50, help="copies of the dataset to aggregate")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--repeat", type=int, default=3, help="best of this many runs")
+    args = parser.parse_args(argv)
+
+    from dataset import DATA_PATH, read_data
+    from metrics import DEFAULT_LATE_THRESHOLD, delay_days, split_agg
+
+    df = _scaled(read_data(args.data or DATA_PATH), args.copies)
+    df["Delay_Days"] = delay_days(df)
+    df["Is_Late"] = df["Delay_Days"] > DEFAULT_LATE_THRESHOLD
+    queries = { #the page group-bys, see metrics.py
+        "state summary": ("State", {"Total_Sales": ("Sales", "sum"), "Num_Sales": ("Order ID", "nunique"),
+                                    "Num_Customers": ("Customer ID", "nunique")}),
+        "segment stats": ("Segment", {"Total_Sales": ("Sales", "sum"), "Num_Sales": ("Order ID", "nunique"),
+                                      "Num_Customers": ("Customer ID", "nunique")}),
+        "top customers": (["Customer ID", "Customer Name"], {"Total_Sales": ("Sales", "sum"),
+                                                             "Num_Orders": ("Order ID", "nunique"),
+                                                             "Lines": ("Sales", "size")}),
+        "order level": ("Order ID", {"OrderDate": ("Order Date", "min"), "Delay_Days": ("Delay_Days", "max"),
+                                     "Is_Late": ("Is_Late", "max")}),
+    }
+
+    def best(fn):
+        times = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            result = fn()
+            times.append(time.perf_counter() - started)
+        return min(times), result
+
+    print(f"{len(df):,} rows, {os.cpu_count()} cpus")
+    print(f"{'query':16s} {'pandas s':>9s} " + " ".join(f"{f'{w} workers s':>12s}" for w in args.workers) + "  same result")
+    for label, (by, named) in queries.items():
+        base_time, expected = best(lambda: df.groupby(by, observed=True).agg(**named))
+        row, same = [], True
+        for w in args.workers:
+            ex = ShardedExecutor(workers=w, min_rows=0)
+            split_agg(ex, df.head(1000), by, named) #start the pool outside the timing
+            seconds, result = best(lambda: split_agg(ex, df, by, named))
+            ex.shutdown()
+            row.append(seconds)
+            try:
+                pd.testing.assert_frame_equal(result, expected, check_exact=True)
+            except AssertionError:
+                same = False
+        print(f"{label:16s} {base_time:9.3f} " + " ".join(f"{s:12.3f}" for s in row) + f"  {'yes' if same else 'NO'}")
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    main()
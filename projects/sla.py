@@ -0,0 +1,156 @@
+#rolling shipping SLA monitor, fed the same rows as the watcher's running totals (see
+#watcher.IncrementalAggregates) so it never rescans history. for every Ship Mode x Region it
+#keeps one bucket of (orders, late orders) per order day for the last max(WINDOWS) days in a
+#ring, plus a running total per window. moving the clock forward a day subtracts the bucket
+#that just left each window and clears the slot it reuses, so expiring old orders costs
+#the same no matter how many there were; adding an order is one increment per window.
+#an order is late when it shipped more than its Ship Mode's SLA_DAYS after it was placed, and
+#a key is in breach while its late rate over a window is above TARGET_LATE_RATE.
+#nothing in here touches streamlit.
+import threading
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from dataset import MISSING_DAY
+from metrics import DEFAULT_LATE_THRESHOLD
+
+WINDOWS = (7, 30) #days of orders, counted back from the newest order day seen
+SLA_DAYS = { #promised days from order to shipping, other modes use DEFAULT_LATE_THRESHOLD
+    "Same Day": 0,
+    "First Class": 2,
+    "Second Class": 4,
+    "Standard Class": 5,
+}
+TARGET_LATE_RATE = 0.35
+MIN_ORDERS = 5 #fewer orders than this in a window is never a breach
+MAX_EVENTS = 500 #breach / recovery events kept
+
+
+class RollingSLA:
+    KEYS = ["Ship Mode", "Region"]
+    COLUMNS = ["Order ID", "Order Day", "Ship Day"] + KEYS
+
+    def __init__(self, windows=WINDOWS, sla_days=SLA_DAYS, target=TARGET_LATE_RATE, min_orders=MIN_ORDERS):
+        self.windows = tuple(sorted(windows))
+        self.ring = self.windows[-1]
+        self.sla_days = dict(sla_days)
+        self.target = target
+        self.min_orders = min_orders
+        self.keys = {} #(ship mode, region) -> row in the arrays below
+        self.buckets = np.zeros((0, self.ring, 2), dtype=np.int64) #key, day % ring, (orders, late)
+        self.totals = np.zeros((len(self.windows), 0, 2), dtype=np.int64) #window, key, (orders, late)
+        self.breached = np.zeros((len(self.windows), 0), dtype=bool)
+        self.today = None #day number of the newest order seen
+        self.events = deque(maxlen=MAX_EVENTS)
+        self._seen = set() #order ids already counted, lines of an order can arrive in two appends
+        self._lock = threading.Lock()
+
+    def update(self, rows):
+        #fold new order lines in (needs Order ID, Order Day, Ship Day and the KEYS columns)
+        orders = rows.drop_duplicates("Order ID") #every line of an order shares its dates and keys
+        ids = orders["Order ID"].astype(str)
+        orders = orders[~ids.isin(self._seen).to_numpy()]
+        orders = orders[(orders["Order Day"] != MISSING_DAY) & (orders["Ship Day"] != MISSING_DAY)]
+        if orders.empty:
+            return self
+
+        codes, modes = pd.factorize(orders["Ship Mode"])
+        allowed = np.array([self.sla_days.get(m, DEFAULT_LATE_THRESHOLD) for m in modes] + [DEFAULT_LATE_THRESHOLD])[codes]
+        day = orders["Order Day"].to_numpy().astype(np.int64)
+        late = (orders["Ship Day"].to_numpy() - day) > allowed
+
+        with self._lock:
+            self._seen.update(ids.loc[orders.index])
+            key = self._rows(orders[self.KEYS])
+            by_day = np.argsort(day, kind="stable")
+            bounds = np.flatnonzero(np.diff(day[by_day])) + 1
+            for part in np.split(by_day, bounds): #one order day at a time, oldest first
+                self._add(int(day[part[0]]), key[part], late[part])
+        return self
+
+    def _rows(self, keys):
+        #row per (ship mode, region), growing the arrays for keys not seen before
+        pairs = list(zip(keys[self.KEYS[0]].astype(str), keys[self.KEYS[1]].astype(str)))
+        new = [p for p in dict.fromkeys(pairs) if p not in self.keys]
+        if new:
+            for pair in new:
+                self.keys[pair] = len(self.keys)
+            n = len(new)
+            self.buckets = np.concatenate([self.buckets, np.zeros((n, self.ring, 2), dtype=np.int64)])
+            self.totals = np.concatenate([self.totals, np.zeros((len(self.windows), n, 2), dtype=np.int64)], axis=1)
+            self.breached = np.concatenate([self.breached, np.zeros((len(self.windows), n), dtype=bool)], axis=1)
+        return np.array([self.keys[p] for p in pairs], dtype=np.int64)
+
+    def _advance(self, day):
+        #move the clock to day, expiring what leaves each window
+        if self.today is None or day - self.today >= self.ring: #nothing recent survives
+            self.buckets[:] = 0
+            self.totals[:] = 0
+        else:
+            for t in range(self.today + 1, day + 1):
+                for i, w in enumerate(self.windows):
+                    self.totals[i] -= self.buckets[:, (t - w) % self.ring]
+                self.buckets[:, t % self.ring] = 0 #held day t - ring, already out of every window
+        self.today = day
+
+    def _add(self, day, key, late):
+        if self.today is None or day > self.today:
+            self._advance(day)
+        age = self.today - day
+        if age >= self.ring:
+            return #older than every window
+        counts = np.stack([np.ones(len(key), dtype=np.int64), late.astype(np.int64)], axis=1)
+        np.add.at(self.buckets, (key, day % self.ring), counts)
+        for i, w in enumerate(self.windows):
+            if age < w:
+                np.add.at(self.totals[i], key, counts)
+        self._check()
+
+    def _check(self):
+        #record keys going into / out of breach as of today
+        orders, late = self.totals[..., 0], self.totals[..., 1]
+        rate = late / np.maximum(orders, 1)
+        breach = (orders >= self.min_orders) & (rate > self.target)
+        names = list(self.keys)
+        for i, k in zip(*np.nonzero(breach != self.breached)):
+            mode, region = names[k]
+            self.events.append({
+                "Day": _date(self.today),
+                "Ship Mode": mode,
+                "Region": region,
+                "Window": f"{self.windows[i]} days",
+                "Event": "breach" if breach[i, k] else "recovered",
+                "Late Rate": float(rate[i, k]),
+                "Orders": int(orders[i, k]),
+            })
+        self.breached = breach
+
+    def state(self):
+        #current SLA state, one row per Ship Mode x Region: orders / late / late rate / breach
+        #per window, plus the SLA days used
+        with self._lock:
+            table = pd.DataFrame(list(self.keys), columns=self.KEYS)
+            table["SLA Days"] = [self.sla_days.get(m, DEFAULT_LATE_THRESHOLD) for m in table["Ship Mode"]]
+            for i, w in enumerate(self.windows):
+                orders, late = self.totals[i, :, 0], self.totals[i, :, 1]
+                table[f"Orders {w}d"] = orders
+                table[f"Late {w}d"] = late
+                table[f"Late Rate {w}d"] = np.where(orders > 0, late / np.maximum(orders, 1), np.nan)
+                table[f"Breach {w}d"] = self.breached[i].copy()
+            return table.sort_values(self.KEYS, ignore_index=True)
+
+    def as_of(self):
+        #date of the newest order seen (None before any)
+        return None if self.today is None else _date(self.today)
+
+    def breach_events(self):
+        #breach / recovery events, newest first
+        with self._lock:
+            events = list(self.events)
+        return pd.DataFrame(events[::-1], columns=["Day", "Ship Mode", "Region", "Window", "Event", "Late Rate", "Orders"])
+
+
+def _date(day):
+    return pd.Timestamp(day, unit="D")
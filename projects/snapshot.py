@@ -0,0 +1,158 @@
+#offline KPI snapshot, run from the repo root after the data changes:
+#   python projects/snapshot.py
+#materialises the headline KPIs and the standard breakdowns for the default (unfiltered)
+#view into a JSON file tagged with the dataset version. the pages serve those numbers
+#straight from the snapshot and only compute live when a filter differs from the default.
+import argparse
+import hashlib
+import io
+import json
+import os
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from dataset import DATA_PATH, read_data
+from partitions import data_files
+from metrics import (
+    DEFAULT_LATE_THRESHOLD, delay_days, late_over_time, order_level, sales_by,
+    sales_kpis, sales_over_time, shipping_kpis, state_summary,
+)
+
+SNAPSHOT_FORMAT = 1 #bump when the layout below changes so old files are rebuilt
+SNAPSHOT_SUFFIX = ".kpis.json"
+
+_version_cache = {} #(path, mtime, size) -> hash, so checking a snapshot doesn't re-hash every time
+
+
+def snapshot_path(data_path=DATA_PATH):
+    #snapshot lives next to the dataset, e.g. Data/train.kpis.json or Data/partitions.kpis.json
+    return os.path.splitext(data_path.rstrip("/\\"))[0] + SNAPSHOT_SUFFIX
+
+
+def dataset_version(data_path=DATA_PATH):
+    #content hash of the dataset file(s)
+    files = data_files(data_path)
+    key = tuple((os.path.abspath(f), os.stat(f).st_mtime_ns, os.stat(f).st_size) for f in files)
+    if key not in _version_cache:
+        digest = hashlib.sha256()
+        for path in files:
+            digest.update(os.path.basename(path).encode("utf-8"))
+            with open(path, "rb") as fh:
+                for block in iter(lambda: fh.read(1 << 20), b""):
+                    digest.update(block)
+        _version_cache[key] = digest.hexdigest()[:16]
+    return _version_cache[key]
+
+
+def _table_to_json(frame):
+    return json.loads(frame.to_json(orient="table", date_format="iso"))
+
+
+def _table_from_json(obj):
+    return pd.read_json(io.StringIO(json.dumps(obj)), orient="table")
+
+
+def _as_python(value):
+    return value.item() if hasattr(value, "item") else value
+
+
+def build_snapshot(df, version, threshold_days=DEFAULT_LATE_THRESHOLD):
+    #everything the pages show for their default filters
+    df = df.assign(Delay_Days=delay_days(df))
+    orders = order_level(df, threshold_days)
+
+    kpis = {
+        **sales_kpis(df),
+        **{f"shipping_{k}": v for k, v in shipping_kpis(orders).items()},
+    }
+
+    tables = {
+        "sales_by_category": sales_by(df, "Category").to_frame(),
+        "sales_by_region": sales_by(df, "Region").to_frame(),
+        "sales_by_segment": sales_by(df, "Segment").to_frame(),
+        "state_summary": state_summary(df),
+        "late_over_time": late_over_time(orders),
+        "monthly_sales": sales_over_time(df, "M"),
+    }
+
+    filters = { #the default selection on every page, a request matching this is "standard"
+        "segments": sorted(df["Segment"].dropna().unique().tolist()),
+        "regions": sorted(df["Region"].dropna().unique().tolist()),
+        "ship_modes": sorted(df["Ship Mode"].dropna().unique().tolist()),
+        "categories": sorted(df["Category"].dropna().unique().tolist()),
+        "start": df["Order Date"].min().date().isoformat(),
+        "end": df["Order Date"].max().date().isoformat(),
+        "threshold_days": threshold_days,
+    }
+
+    return {
+        "format": SNAPSHOT_FORMAT,
+        "dataset_version": version,
+        "built_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "filters": filters,
+        "kpis": {k: _as_python(v) for k, v in kpis.items()},
+        "tables": {k: _table_to_json(v) for k, v in tables.items()},
+    }
+
+
+def write_snapshot(data_path=DATA_PATH, out_path=None):
+    out_path = out_path or snapshot_path(data_path)
+    snap = build_snapshot(read_data(data_path), dataset_version(data_path))
+
+    tmp_path = out_path + ".tmp" #write then rename so the app never reads half a file
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        json.dump(snap, fh)
+    os.replace(tmp_path, out_path)
+    return out_path, snap
+
+
+def load_snapshot(data_path=DATA_PATH, snap_path=None):
+    #the snapshot for the current dataset, or None if it is missing / stale / old format
+    snap_path = snap_path or snapshot_path(data_path)
+    if not os.path.exists(snap_path) or not os.path.exists(data_path):
+        return None
+
+    with open(snap_path, encoding="utf-8") as fh:
+        snap = json.load(fh)
+
+    if snap.get("format") != SNAPSHOT_FORMAT or snap.get("dataset_version") != dataset_version(data_path):
+        return None
+
+    snap["tables"] = {k: _table_from_json(v) for k, v in snap["tables"].items()}
+    return snap
+
+
+def is_standard(snap, **filters):
+    #True if every given filter equals the default the snapshot was built for
+    #lists compare as sets, start/end compare as dates, None means "not filtered"
+    if snap is None:
+        return False
+
+    standard = snap["filters"]
+    for name, value in filters.items():
+        if value is None:
+            continue
+        if name in ("start", "end"):
+            if pd.to_datetime(value).date().isoformat() != standard[name]:
+                return False
+        elif isinstance(value, (list, tuple, set)):
+            if sorted(map(str, value)) != standard[name]:
+                return False
+        elif value != standard[name]:
+            return False
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the KPI snapshot for a dataset.")
+    parser.add_argument("--data", default=DATA_PATH, help="path to train.csv")
+    parser.add_argument("--out", default=None, help="snapshot path (default: next to the data file)")
+    args = parser.parse_args(argv)
+
+    out_path, snap = write_snapshot(args.data, args.out)
+    print(f"wrote {out_path} for dataset version {snap['dataset_version']}")
+
+
+if __name__ == "__main__":
+    main()
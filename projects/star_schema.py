@@ -0,0 +1,117 @@
+#star-schema view of train.csv. the wide file repeats customer, product and address text on
+#every order line; here the lines become a compact fact table of integer keys, day ordinals
+#and Sales, and the repeated attributes live once in small dimension tables. pages ask
+#frame() for the columns they actually show and only those get joined back on.
+import numpy as np
+import pandas as pd
+
+from dataset import MISSING_DAY, day_numbers, days_to_dates
+
+#dimension table -> (its key on the fact table, the wide columns it holds). the key is
+#over all of the columns together, e.g. a Product ID that appears with two names is two products
+DIMENSIONS = {
+    "customers": ("customer_key", ["Customer ID", "Customer Name", "Segment"]),
+    "products": ("product_key", ["Product ID", "Product Name", "Category", "Sub-Category"]),
+    "geography": ("geo_key", ["Country", "City", "State", "Postal Code", "Region"]),
+}
+#order header attributes, one row per Order ID
+ORDER_COLUMNS = ["Order ID", "Order Date", "Ship Date", "Ship Mode"]
+#the wide columns a StarSchema is built from
+STAR_COLUMNS = [c for _, cols in DIMENSIONS.values() for c in cols] + ORDER_COLUMNS + ["Sales"]
+
+_EPOCH = np.datetime64("1970-01-01", "D")
+
+
+def to_ordinal(dates):
+    #datetime64 values -> int32 days since 1970-01-01, NaT -> MISSING_DAY (same numbers as
+    #dataset.day_numbers)
+    return day_numbers(dates)
+
+
+def from_ordinal(days):
+    #MISSING_DAY -> NaT
+    return days_to_dates(days)
+
+
+def day_ordinal(ts):
+    #one date -> days since 1970-01-01
+    return int((np.datetime64(pd.Timestamp(ts).date(), "D") - _EPOCH).astype(np.int64))
+
+
+def _key(df, cols):
+    #int32 key per row for the distinct combinations of cols, numbered by first appearance
+    return df.groupby(cols, observed=True, dropna=False, sort=False).ngroup().to_numpy().astype(np.int32)
+
+
+def _dimension(df, cols, keys, key_name):
+    first = ~pd.Series(keys).duplicated().to_numpy() #first row of every key, already in key order
+    dim = df.loc[first, cols].reset_index(drop=True)
+    dim.insert(0, key_name, np.arange(len(dim), dtype=np.int32))
+    return dim
+
+
+class StarSchema:
+    def __init__(self, df):
+        self.dimensions = {}
+        fact = {}
+
+        for name, (key_name, cols) in DIMENSIONS.items():
+            keys = _key(df, cols)
+            self.dimensions[name] = _dimension(df, cols, keys, key_name)
+            fact[key_name] = keys
+
+        #order header, with the dates turned into ordinals and the delay worked out once
+        order_keys = _key(df, ["Order ID"])
+        orders = _dimension(df, ORDER_COLUMNS, order_keys, "order_key")
+        orders["order_day"] = to_ordinal(orders.pop("Order Date"))
+        orders["ship_day"] = to_ordinal(orders.pop("Ship Date"))
+        known = (orders["order_day"] != MISSING_DAY) & (orders["ship_day"] != MISSING_DAY)
+        delay = (orders["ship_day"] - orders["order_day"]).astype(np.int16 if known.all() else np.float32)
+        orders["delay_days"] = delay if known.all() else delay.where(known) #NaN without both dates
+        self.orders = orders
+
+        fact["order_key"] = order_keys
+        fact["order_day"] = orders["order_day"].to_numpy()[order_keys] #kept on the fact for date filtering
+        fact["Sales"] = df["Sales"].to_numpy()
+        self.fact = pd.DataFrame(fact)
+
+        #where each wide column can be found
+        self._source = {"Sales": (None, None)}
+        for name, (key_name, cols) in DIMENSIONS.items():
+            self._source.update({c: (self.dimensions[name], key_name) for c in cols})
+        self._source.update({
+            c: (self.orders, "order_key")
+            for c in ["Order ID", "Ship Mode", "order_day", "ship_day", "delay_days"]
+        })
+
+    def frame(self, columns, start=None, end=None):
+        #wide frame with just columns, for fact rows with Order Date in [start, end].
+        #Order Date / Ship Date are rebuilt from the ordinals, everything else is a take()
+        #from its dimension by key, which is the whole join
+        fact = self.fact
+        if start is not None or end is not None:
+            days = fact["order_day"].to_numpy()
+            keep = days != MISSING_DAY #no Order Date is outside every range, like NaT in filter_mask
+            if start is not None:
+                keep &= days >= day_ordinal(start)
+            if end is not None:
+                keep &= days <= day_ordinal(end)
+            fact = fact[keep]
+
+        out = {}
+        for col in columns:
+            if col == "Order Date":
+                out[col] = from_ordinal(fact["order_day"].to_numpy())
+            elif col == "Ship Date":
+                out[col] = from_ordinal(self.orders["ship_day"].to_numpy()[fact["order_key"].to_numpy()])
+            elif col == "Sales":
+                out[col] = fact["Sales"].to_numpy()
+            else:
+                table, key_name = self._source[col]
+                out[col] = table[col].array.take(fact[key_name].to_numpy()) #keeps category dtypes
+        return pd.DataFrame(out, index=fact.index)
+
+    def memory_usage(self):
+        #bytes per table, to compare against the wide frame
+        tables = {"fact": self.fact, "orders": self.orders, **self.dimensions}
+        return {name: int(t.memory_usage(deep=True).sum()) for name, t in tables.items()}
@@ -0,0 +1,102 @@
+#html tables without pandas' Styler. Styler formats and styles one cell at a time and writes
+#an id + css rule per styled cell; here a column is formatted in one pass over its values,
+#the alignment / font rules are a few nth-child selectors for the table, and the markup is
+#cached by the content of the frame and the formatting asked for, so a rerun with the same
+#rows is a dict lookup. nothing in here touches streamlit; pages
+#pass the result to st.markdown(..., unsafe_allow_html=True).
+import hashlib
+import html
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from diskcache import frame_hash
+
+MAX_TABLES = 128 #rendered tables kept in memory across sessions
+
+
+def number(values, decimals=2, prefix=""):
+    #f"{prefix}{x:,.{decimals}f}" for every value (NaN -> "") as an array of str. str.format
+    #over a plain list of floats, the rounding and sign placement are exactly the f-string's
+    fmt = f"{prefix}{{:,.{decimals}f}}".format
+    return np.array([fmt(x) if x == x else "" for x in np.asarray(values, dtype=np.float64).tolist()], dtype=str)
+
+
+def money(values):
+    #$1,234.56
+    return number(values, 2, prefix="$")
+
+
+FORMATS = {
+    "money": money,
+    "decimal": lambda values: number(values, 2),
+    "integer": lambda values: number(values, 0),
+}
+
+
+def _text(values):
+    #any other column: str() of each distinct value, html escaped, spread back over the rows
+    codes, uniques = pd.factorize(values)
+    escaped = np.array([html.escape(str(u)) for u in uniques] + [""], dtype=object)
+    return escaped[codes] #code -1 (missing) picks the trailing ""
+
+
+def _css(props):
+    return "; ".join(f"{k}: {v}" for k, v in props.items())
+
+
+def _render(df, formats, align, header_css, cell_css, name):
+    rules = [f".{name} {tag} {{{_css(props)}}}" for tag, props in [("th", header_css), ("td", cell_css)] if props]
+    for i, col in enumerate(df.columns, start=1):
+        if col in align:
+            rules.append(f".{name} td:nth-child({i}) {{text-align: {align[col]}}}")
+
+    cells = np.empty((len(df), 2 * len(df.columns) + 1), dtype=object)
+    cells[:, 0::2] = "</td><td>"
+    cells[:, 0] = "<tr><td>"
+    cells[:, -1] = "</td></tr>"
+    for i, col in enumerate(df.columns):
+        fmt = formats.get(col)
+        cells[:, 2 * i + 1] = FORMATS[fmt](df[col]) if fmt else _text(df[col])
+
+    header = "".join(f"<th>{html.escape(str(col))}</th>" for col in df.columns)
+    return (
+        f"<style>{' '.join(rules)}</style>"
+        f'<table class="{name}"><thead><tr>{header}</tr></thead>'
+        f"<tbody>{''.join(cells.ravel().tolist())}</tbody></table>"
+    )
+
+
+class _Rendered:
+    def __init__(self):
+        self.tables = OrderedDict()
+        self.lock = threading.Lock()
+
+
+_rendered = _Rendered()
+
+
+def html_table(df, formats=None, align=None, header_css=None, cell_css=None):
+    #df as an html table without its index. formats: {column: "money" | "decimal" | "integer"},
+    #align: {column: "left" | "center" | "right"}, header_css / cell_css: css properties for
+    #every th / td, e.g. {"font-size": "18px"}
+    formats, align = formats or {}, align or {}
+    header_css, cell_css = header_css or {}, cell_css or {}
+    spec = repr((sorted(formats.items()), sorted(align.items()), sorted(header_css.items()), sorted(cell_css.items())))
+    key = frame_hash(df.reset_index(drop=True)) + spec
+
+    with _rendered.lock:
+        markup = _rendered.tables.get(key)
+        if markup is not None:
+            _rendered.tables.move_to_end(key)
+            return markup
+
+    name = "tbl-" + hashlib.sha256(key.encode("utf-8")).hexdigest()[:12] #scopes the css rules to this table
+    markup = _render(df, formats, align, header_css, cell_css, name)
+    with _rendered.lock:
+        _rendered.tables[key] = markup
+        while len(_rendered.tables) > MAX_TABLES:
+            _rendered.tables.popitem(last=False)
+    return markup
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+from tables import html_table, money, number
+
+EDGES = [
+    0.0, -0.0, 1.0, -1.0, 0.005, -0.005, 7128.615, 571785.265, 999.995, -999.995, 1234567.891,
+    9.2e16, 1e19, -1e19, 1.7976931348623157e308, np.inf, -np.inf,
+]
+
+
+def expected(values, decimals=2, prefix=""):
+    return [
+        "" if np.isnan(x) else f"{prefix}{x:,.{decimals}f}"
+        for x in values
+    ]
+
+
+def test_number_matches_the_f_string():
+    rng = np.random.default_rng(0)
+    values = np.concatenate([
+        EDGES,
+        np.round(rng.uniform(-1e6, 1e6, 20_000), 3), #half cents, where rounding differs most
+        rng.lognormal(5, 4, 5_000),
+    ])
+    for decimals in (0, 2):
+        assert number(values, decimals).tolist() == expected(values, decimals)
+
+
+def test_money_keeps_the_sign_after_the_prefix():
+    values = [-1.0, 7128.615, -571785.265, np.inf, -np.inf, 1e19]
+    assert money(values).tolist() == expected(values, prefix="$")
+    assert money([-1.0])[0] == "$-1.00"
+
+
+def test_missing_values_are_blank():
+    values = pd.Series([1.5, np.nan, None, -2.25], dtype=float)
+    assert money(values).tolist() == ["$1.50", "", "", "$-2.25"]
+
+
+def test_empty():
+    assert number([]).tolist() == []
+
+
+def test_html_table_formats_columns():
+    df = pd.DataFrame({"Name": ["a<b", "c"], "Total": [1234.5, np.nan]})
+    markup = html_table(df, formats={"Total": "money"})
+    assert "<td>a&lt;b</td><td>$1,234.50</td>" in markup
+    assert "<td>c</td><td></td>" in markup
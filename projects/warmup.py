@@ -0,0 +1,38 @@
+#boot-time warm-up: fill the dataset / snapshot caches and pull in the plotting libraries
+#on a background thread so the first visitor to a page doesn't pay for the CSV parse.
+#app.py and every page call start(); st.cache_resource makes it run once per server process.
+import importlib
+import threading
+import time
+
+import streamlit as st
+
+from loader import default_dataset, load_data, load_kpi_snapshot, load_star
+
+#heavy modules the pages import lazily when they draw a chart
+PLOTTING_MODULES = ["plotly.express", "matplotlib.pyplot"]
+WARM_COLUMNS = ["Order Date", "Order Day"]
+
+
+def _warm(timings):
+    def timed(name, fn):
+        started = time.perf_counter()
+        fn()
+        timings[name] = time.perf_counter() - started
+
+    dataset = default_dataset() #no session here, warm the one every session starts on
+    timed("kpi snapshot", lambda: load_kpi_snapshot(dataset=dataset)) #cheap, and it serves the default filters
+    #the csv parse (it writes the parquet snapshot every later column read comes from, see
+    #registry.py) with just the date columns every page filters on, the pages read the rest
+    timed("dataset", lambda: load_data(dataset=dataset, columns=WARM_COLUMNS))
+    timed("star schema", lambda: load_star(dataset=dataset))
+    for module in PLOTTING_MODULES:
+        timed(module, lambda: importlib.import_module(module))
+
+
+@st.cache_resource
+def start():
+    #kick off the warm-up thread, returns the dict its timings (seconds) are written to
+    timings = {}
+    threading.Thread(target=_warm, args=(timings,), name="cache-warmup", daemon=True).start()
+    return timings
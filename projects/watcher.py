@@ -0,0 +1,193 @@
+#background watcher for the dataset file(s). it polls the files, and when they change it
+#bumps a dataset version that the loader's caches are keyed on. rows appended to the end
+#of train.csv (or new partition files) are read on their own and folded into the running
+#aggregates (IncrementalAggregates below) instead of re-reading everything. everything
+#else keyed on the version (the registry's columns, date index, star schema, sample) is
+#built again from the whole dataset by the on_change callbacks. all of it happens on the
+#watcher thread so user reruns keep being served from the previous version until the new
+#one is ready.
+#the aggregates cover the whole order history, so their first build (at boot, and after
+#any change that isn't an append) reads every row of the dataset: just their COLUMNS, and
+#for a partitioned dataset one partition at a time, but every partition all the same. date
+#pruning only ever saves the pages' own reads, not this one.
+import io
+import os
+import threading
+import time
+from collections import defaultdict
+
+import pandas as pd
+
+from partitions import data_files
+from customers import CustomerAnalytics
+from sla import RollingSLA
+
+POLL_SECONDS = 2.0
+_TAIL_CHECK_BYTES = 4096 #bytes before the old end of file compared to detect a pure append
+
+
+def _signature(path):
+    return {f: (os.stat(f).st_mtime_ns, os.stat(f).st_size) for f in data_files(path)}
+
+
+def _read_tail(path, offset, size):
+    with open(path, "rb") as fh:
+        fh.seek(max(offset - size, 0))
+        return fh.read(min(size, offset))
+
+
+class IncrementalAggregates:
+    #running totals that only ever need the new rows: sales, line and order counts,
+    #sales per Category / Region / Segment / State / order month, the rolling
+    #shipping SLA per Ship Mode x Region (see sla.py) and the customer RFM / cohort
+    #table (see customers.py)
+    BREAKDOWNS = ["Category", "Region", "Segment", "State"]
+    COLUMNS = list(dict.fromkeys(
+        ["Order ID", "Order Date", "Sales"] + BREAKDOWNS + RollingSLA.COLUMNS + CustomerAnalytics.COLUMNS
+    ))
+
+    def __init__(self):
+        self.total_sales = 0.0
+        self.lines = 0
+        self.order_ids = set()
+        self.sales_by = {col: defaultdict(float) for col in self.BREAKDOWNS}
+        self.monthly_sales = defaultdict(float)
+        self.sla = RollingSLA()
+        self.customers = CustomerAnalytics()
+
+    def update(self, rows):
+        self.total_sales += float(rows["Sales"].sum())
+        self.lines += len(rows)
+        self.order_ids.update(rows["Order ID"].astype(str))
+
+        for col in self.BREAKDOWNS:
+            for key, value in rows.groupby(col, observed=True)["Sales"].sum().items():
+                self.sales_by[col][key] += value
+
+        months = rows["Order Date"].dt.to_period("M").dt.to_timestamp()
+        for key, value in rows["Sales"].groupby(months).sum().items():
+            self.monthly_sales[key] += value
+
+        self.sla.update(rows)
+        self.customers.update(rows)
+        return self
+
+    def kpis(self):
+        total_orders = len(self.order_ids)
+        return {
+            "total_sales": self.total_sales,
+            "total_orders": total_orders,
+            "avg_order_value": self.total_sales / max(total_orders, 1),
+            "lines": self.lines,
+        }
+
+    def table(self, col):
+        #sales per value of col, biggest first, same shape as metrics.sales_by
+        series = pd.Series(dict(self.sales_by[col]), name="Sales", dtype=float)
+        series.index.name = col
+        return series.sort_values(ascending=False)
+
+
+class DatasetWatcher:
+    #poll path on a daemon thread; version goes up by one every time the data changes.
+    #on_change callbacks run on the watcher thread with the new version before it is
+    #published, which is where the loader re-warms its caches
+    def __init__(self, path, read, interval=POLL_SECONDS):
+        self.path = path
+        self.read = read #read(path, columns=...) -> frame, read(path, tail_bytes) for appended csv rows
+        self.interval = interval
+        self.version = 0
+        self.aggregates = None
+        self.last_change = None
+        self.on_change = []
+        self._signature = {}
+        self._tail = None
+        self.error = None #last read that failed, None once one succeeds
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event() #set to poll now instead of after interval
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="dataset-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def refresh(self):
+        #have the watcher thread look for changes now instead of at the next poll, returns
+        #at once (the version moves when the new data is ready, see loader.refresh_on_change)
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self.aggregates is None:
+                    with self._lock: #first build of the aggregates happens here, off the caller's thread
+                        self._rebuild(_signature(self.path))
+                else:
+                    self.check()
+                self.error = None
+            except (OSError, ValueError, pd.errors.ParserError) as e:
+                self.error = f"{type(e).__name__}: {e}" #file mid-write or briefly missing, try again on the next poll
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def check(self):
+        #look for changes now, returns True if the version moved
+        with self._lock: #the poll thread and a manual refresh can't both apply the same change
+            signature = _signature(self.path)
+            if signature == self._signature:
+                return False
+
+            appended = self._appended_rows(signature) if self._signature else None
+            if appended is None:
+                self._rebuild(signature)
+            else:
+                self.aggregates.update(appended)
+                self._signature = signature
+                self._tail = self._tail_of(signature)
+
+            new_version = self.version + 1
+            for callback in self.on_change:
+                callback(new_version)
+            self.version = new_version
+            self.last_change = time.time()
+            return True
+
+    def _rebuild(self, signature):
+        #every file folded in on its own, so the whole history is never one frame
+        aggregates = IncrementalAggregates()
+        for path in data_files(self.path):
+            aggregates.update(self.read(path, columns=IncrementalAggregates.COLUMNS))
+        self.aggregates = aggregates
+        self._signature = signature
+        self._tail = self._tail_of(signature)
+
+    def _tail_of(self, signature):
+        if os.path.isdir(self.path):
+            return None
+        return _read_tail(self.path, signature[self.path][1], _TAIL_CHECK_BYTES)
+
+    def _appended_rows(self, signature):
+        #the new rows if the change was a pure append, otherwise None (full rebuild)
+        if os.path.isdir(self.path):
+            old = self._signature
+            if any(signature.get(f) != sig for f, sig in old.items()):
+                return None #an existing partition changed or went away
+            new_files = [f for f in signature if f not in old]
+            return pd.concat([self.read(f, columns=IncrementalAggregates.COLUMNS) for f in new_files], ignore_index=True)
+
+        old_size = self._signature[self.path][1]
+        new_size = signature[self.path][1]
+        if new_size <= old_size or not self._tail.endswith(b"\n"):
+            return None
+        if _read_tail(self.path, old_size, _TAIL_CHECK_BYTES) != self._tail:
+            return None #the existing rows were edited, not just appended to
+
+        with open(self.path, "rb") as fh:
+            fh.seek(old_size)
+            return self.read(self.path, io.BytesIO(fh.read(new_size - old_size)))